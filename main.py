@@ -1,27 +1,48 @@
 #!/usr/bin/env python3
 
-from dbus_next.aio import MessageBus
 from dbus_next.service import (ServiceInterface,
                                method, dbus_property)
 from dbus_next.constants import PropertyAccess
 from dbus_next import DBusError, BusType
 
 import asyncio
+import os
 
-from ofono2mm import MMModemInterface, Ofono, DBus
-from ofono2mm.utils import async_locked
+from ofono2mm import MMModemInterface, Ofono, DBus, DebugInterface, ObjectManagerBus
+from ofono2mm.metrics import metrics
+from ofono2mm.utils import async_locked, async_run_stages, RetryPolicy, SignalSubscriptions
 
 has_bus = False
 
+def is_ril_modem(path):
+    # only the modems exposed by the ril plugin are backed by the android radio
+    return path.startswith("/ril_")
+
+def get_modem_filter():
+    # OFONO2MM_MODEMS lets other modems in, as comma separated ofono path prefixes like /quectel_ or as all
+    modems = os.environ.get('OFONO2MM_MODEMS', '').strip()
+    if not modems:
+        return is_ril_modem
+
+    if modems == 'all':
+        return lambda path: True
+
+    prefixes = tuple(prefix.strip() for prefix in modems.split(',') if prefix.strip())
+    return lambda path: path.startswith(prefixes)
+
 class MMInterface(ServiceInterface):
-    def __init__(self, loop, bus):
+    def __init__(self, loop, bus, modem_filter=is_ril_modem):
         super().__init__('org.freedesktop.ModemManager1')
         self.loop = loop
         self.bus = bus
+        self.modem_filter = modem_filter
         self.ofono_client = Ofono(bus)
         self.dbus_client = DBus(bus)
-        self.mm_modem_interfaces = []
-        self.mm_modem_objects = []
+        self.ofono_manager_interface = None
+        self.subscriptions = SignalSubscriptions()
+        self.mm_modems = {} # ofono modem path: modem interface
+        self.mm_modem_indices = {} # ofono modem path: index, a modem coming back keeps its object path
+        self.mm_modem_setups = {} # ofono modem path: future done once the modem finished setting up
         self.loop.create_task(self.check_ofono_presence())
 
     @dbus_property(access=PropertyAccess.READ)
@@ -46,45 +67,29 @@ class MMInterface(ServiceInterface):
 
     def ofono_added(self):
         self.ofono_manager_interface = self.ofono_client["ofono"]["/"]["org.ofono.Manager"]
-        self.ofono_manager_interface.on_modem_added(self.ofono_modem_added)
-        self.ofono_manager_interface.on_modem_removed(self.ofono_modem_removed)
+        self.subscriptions.on(self.ofono_manager_interface, 'modem_added', self.ofono_modem_added)
+        self.subscriptions.on(self.ofono_manager_interface, 'modem_removed', self.ofono_modem_removed)
         self.loop.create_task(self.find_ofono_modems())
 
     def ofono_removed(self):
+        self.subscriptions.clear()
+        for mm_modem_interface in self.mm_modems.values():
+            mm_modem_interface.teardown()
+
+        self.mm_modems = {}
         self.ofono_manager_interface = None
+        self.ofono_client.evict('/')
 
     @async_locked
     async def find_ofono_modems(self):
-        global has_bus
-
-        for mm_object in self.mm_modem_objects:
-            self.bus.unexport(mm_object)
-
-        self.mm_modem_objects = []
-        self.mm_modem_intefaces = []
-
         if not self.ofono_manager_interface:
             return
 
-        self.ofono_modem_list = False
-        while not self.ofono_modem_list:
-            try:
-                self.ofono_modem_list = [
-                    x
-                    for x in await self.ofono_manager_interface.call_get_modems()
-                    if x[0].startswith("/ril_") # FIXME
-                ]
-            except DBusError:
-                pass
+        # ofono might not be ready to answer yet at boot, modems showing up later are exported on ModemAdded
+        retry_policy = RetryPolicy('get_modems', max_delay=30, failure_threshold=0)
+        ofono_modem_list = await retry_policy.run(self.ofono_manager_interface.call_get_modems)
 
-        self.i = 0
-
-        for modem in self.ofono_modem_list:
-            await self.export_new_modem(modem[0], modem[1])
-
-        if not has_bus and len(self.mm_modem_objects) != 0:
-            await self.bus.request_name('org.freedesktop.ModemManager1')
-            has_bus = True
+        await asyncio.gather(*[self.export_new_modem(modem[0], modem[1]) for modem in ofono_modem_list if self.modem_filter(modem[0])])
 
     def dbus_name_owner_changed(self, name, old_owner, new_owner):
         if name == "org.ofono":
@@ -94,43 +99,74 @@ class MMInterface(ServiceInterface):
                 self.ofono_added()
 
     def ofono_modem_added(self, path, mprops):
-        try:
-            self.loop.create_task(self.export_new_modem(path, props))
-        except Exception as e:
-            pass
+        if self.modem_filter(path):
+            self.loop.create_task(self.export_new_modem(path, mprops))
 
     async def export_new_modem(self, path, mprops):
-        mm_modem_interface = MMModemInterface(self.loop, self.i, self.bus, self.ofono_client, path)
-        mm_modem_interface.ofono_props = mprops
-        self.ofono_client["ofono_modem"][path]['org.ofono.Modem'].on_property_changed(mm_modem_interface.ofono_changed)
-        await mm_modem_interface.init_ofono_interfaces()
-        self.bus.export(f'/org/freedesktop/ModemManager1/Modem/{self.i}', mm_modem_interface)
-        mm_modem_interface.set_props()
-        await mm_modem_interface.init_mm_sim_interface()
-        await mm_modem_interface.init_mm_3gpp_interface()
-        await mm_modem_interface.init_mm_3gpp_ussd_interface()
-        await mm_modem_interface.init_mm_3gpp_profile_manager_interface()
-        await mm_modem_interface.init_mm_messaging_interface()
-        await mm_modem_interface.init_mm_simple_interface()
-        await mm_modem_interface.init_mm_firmware_interface()
-        await mm_modem_interface.init_mm_time_interface()
-        await mm_modem_interface.init_mm_cdma_interface()
-        await mm_modem_interface.init_mm_sar_interface()
-        await mm_modem_interface.init_mm_oma_interface()
-        await mm_modem_interface.init_mm_signal_interface()
-        await mm_modem_interface.init_mm_location_interface()
-        await mm_modem_interface.init_mm_voice_interface()
-        self.mm_modem_interfaces.append(mm_modem_interface)
-        self.mm_modem_objects.append(f'/org/freedesktop/ModemManager1/Modem/{self.i}')
-        self.i += 1
+        global has_bus
+
+        # a modem removed while it was still being set up only tears itself down once its stages are done,
+        # wait for that before exporting it again at the same object path
+        while path in self.mm_modem_setups:
+            await self.mm_modem_setups[path]
+
+        if path in self.mm_modems:
+            return
+
+        self.mm_modem_setups[path] = self.loop.create_future()
+        index = self.mm_modem_indices.setdefault(path, len(self.mm_modem_indices))
+        mm_modem_interface = MMModemInterface(self.loop, index, self.bus, self.ofono_client, path)
+        self.mm_modems[path] = mm_modem_interface
+        mm_modem_interface.ofono_props.update(mprops)
+        mm_modem_interface.subscriptions.on(self.ofono_client["ofono_modem"][path]['org.ofono.Modem'], 'property_changed', mm_modem_interface.ofono_changed)
+
+        async def export_modem():
+            mm_modem_interface.export_modem_interface(mm_modem_interface)
+            mm_modem_interface.set_props()
+
+        # every interface only needs the ofono interfaces to be known,
+        # the firmware one also reads the revision set on the modem
+        try:
+            await async_run_stages({
+                'ofono_interfaces': (mm_modem_interface.init_ofono_interfaces, []),
+                'modem': (export_modem, ['ofono_interfaces']),
+                'sim': (mm_modem_interface.init_mm_sim_interface, ['ofono_interfaces']),
+                '3gpp': (mm_modem_interface.init_mm_3gpp_interface, ['ofono_interfaces']),
+                '3gpp_ussd': (mm_modem_interface.init_mm_3gpp_ussd_interface, ['ofono_interfaces']),
+                '3gpp_profile_manager': (mm_modem_interface.init_mm_3gpp_profile_manager_interface, ['ofono_interfaces']),
+                'messaging': (mm_modem_interface.init_mm_messaging_interface, ['ofono_interfaces']),
+                'simple': (mm_modem_interface.init_mm_simple_interface, ['ofono_interfaces']),
+                'firmware': (mm_modem_interface.init_mm_firmware_interface, ['modem']),
+                'time': (mm_modem_interface.init_mm_time_interface, ['ofono_interfaces']),
+                'cdma': (mm_modem_interface.init_mm_cdma_interface, ['ofono_interfaces']),
+                'sar': (mm_modem_interface.init_mm_sar_interface, ['ofono_interfaces']),
+                'oma': (mm_modem_interface.init_mm_oma_interface, ['ofono_interfaces']),
+                'signal': (mm_modem_interface.init_mm_signal_interface, ['ofono_interfaces']),
+                'location': (mm_modem_interface.init_mm_location_interface, ['ofono_interfaces']),
+                'voice': (mm_modem_interface.init_mm_voice_interface, ['ofono_interfaces']),
+            }, mm_modem_interface.init_timings)
+        finally:
+            # the modem went away again while it was being set up
+            if self.mm_modems.get(path) is not mm_modem_interface:
+                mm_modem_interface.teardown()
+
+            self.mm_modem_setups.pop(path).set_result(None)
+
+        if self.mm_modems.get(path) is not mm_modem_interface:
+            return
+
+        for stage, seconds in mm_modem_interface.init_timings.items():
+            metrics.observe(f'modem.init.{stage}_seconds', seconds)
+
+        if not has_bus:
+            has_bus = True
+            await self.bus.request_name('org.freedesktop.ModemManager1')
 
     def ofono_modem_removed(self, path):
-        for mm_object in self.mm_modem_objects:
-            try:
-                if mm_object.modem_name == path:
-                    self.bus.unexport(mm_object)
-            except Exception as e:
-                pass
+        if path in self.mm_modems:
+            self.mm_modems.pop(path).teardown()
+
+        self.ofono_client.evict(path)
 
     @method()
     def SetLogging(self, level: 's'):
@@ -145,10 +181,11 @@ class MMInterface(ServiceInterface):
         pass
 
 async def main():
-    bus = await MessageBus(bus_type=BusType.SYSTEM).connect()
+    bus = await ObjectManagerBus(bus_type=BusType.SYSTEM).connect()
     loop = asyncio.get_running_loop()
-    mm_manager_interface = MMInterface(loop, bus)
+    mm_manager_interface = MMInterface(loop, bus, get_modem_filter())
     bus.export('/org/freedesktop/ModemManager1', mm_manager_interface)
+    bus.export('/org/freedesktop/ModemManager1', DebugInterface(mm_manager_interface))
     await bus.wait_for_disconnect()
 
 asyncio.run(main())
@@ -15,6 +15,8 @@ from .mm_sms import *
 from .mm_call import *
 from .mm_modem_voice import *
 from .ofono import *
+from .debug import *
+from .object_manager import *
 
 __all__ = [
 	"MMModem3gppInterface",
@@ -36,4 +38,6 @@ __all__ = [
 	"MMCallInterface",
 	"MMModemVoiceInterface",
 	"Ofono",
+	"DebugInterface",
+	"ObjectManagerBus",
 ]
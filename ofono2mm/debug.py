@@ -0,0 +1,23 @@
+from dbus_next.service import ServiceInterface, method
+from dbus_next import Variant, DBusError
+
+from ofono2mm.metrics import metrics
+
+class DebugInterface(ServiceInterface):
+    def __init__(self, mm_manager):
+        super().__init__('org.droidian.ofono2mm.Debug')
+        self.mm_manager = mm_manager
+
+    @method()
+    def GetMetrics(self) -> 'a{sv}':
+        return metrics.to_variants()
+
+    @method()
+    def GetSignalStatistics(self, modem: 'o', window: 'u') -> 'a{sv}':
+        # window in seconds, 0 covers the whole history
+        for mm_modem_interface in self.mm_manager.mm_modems.values():
+            if f'/org/freedesktop/ModemManager1/Modem/{mm_modem_interface.index}' == modem and mm_modem_interface.mm_modem_signal_interface:
+                stats = mm_modem_interface.mm_modem_signal_interface.history.statistics(window)
+                return {key: Variant('a{sd}', values) for key, values in stats.items()}
+
+        raise DBusError('org.freedesktop.ModemManager1.Error.Core.NotFound', f'No signal history for {modem}')
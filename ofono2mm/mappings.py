@@ -0,0 +1,120 @@
+# lookup tables translating ofono property values into their modemmanager counterparts
+
+# ofono technology: (access technology, cell type)
+ACCESS_TECHNOLOGIES = {
+    'nr': (1 << 15, 6), # MM_MODEM_ACCESS_TECHNOLOGY_5GNR, MM_CELL_TYPE_5GNR
+    'lte': (1 << 14, 5), # MM_MODEM_ACCESS_TECHNOLOGY_LTE, MM_CELL_TYPE_LTE
+    'hspa': (1 << 8, 3), # MM_MODEM_ACCESS_TECHNOLOGY_HSPA, MM_CELL_TYPE_UMTS
+    'hsupa': (1 << 7, 3), # MM_MODEM_ACCESS_TECHNOLOGY_HSUPA, MM_CELL_TYPE_UMTS
+    'hsdpa': (1 << 6, 3), # MM_MODEM_ACCESS_TECHNOLOGY_HSDPA, MM_CELL_TYPE_UMTS
+    'umts': (1 << 5, 3), # MM_MODEM_ACCESS_TECHNOLOGY_UMTS, MM_CELL_TYPE_UMTS
+    'edge': (1 << 4, 2), # MM_MODEM_ACCESS_TECHNOLOGY_EDGE, MM_CELL_TYPE_GSM
+    'gprs': (1 << 3, 2), # MM_MODEM_ACCESS_TECHNOLOGY_GPRS, MM_CELL_TYPE_GSM
+    'gsm': (1 << 1, 2), # MM_MODEM_ACCESS_TECHNOLOGY_GSM, MM_CELL_TYPE_GSM
+}
+
+# ofono registration status: 3gpp registration state
+REGISTRATION_STATES = {
+    'unregistered': 0, # MM_MODEM_3GPP_REGISTRATION_STATE_IDLE
+    'registered': 1, # MM_MODEM_3GPP_REGISTRATION_STATE_HOME
+    'searching': 2, # MM_MODEM_3GPP_REGISTRATION_STATE_SEARCHING
+    'denied': 3, # MM_MODEM_3GPP_REGISTRATION_STATE_DENIED
+    'unknown': 4, # MM_MODEM_3GPP_REGISTRATION_STATE_UNKNOWN
+    'roaming': 5, # MM_MODEM_3GPP_REGISTRATION_STATE_ROAMING
+}
+REGISTRATION_STATE_UNKNOWN = 4 # MM_MODEM_3GPP_REGISTRATION_STATE_UNKNOWN
+
+# ofono registration status: state of an enabled modem
+MODEM_STATES = {
+    'registered': 8, # MM_MODEM_STATE_REGISTERED
+    'roaming': 8, # MM_MODEM_STATE_REGISTERED
+    'searching': 7, # MM_MODEM_STATE_SEARCHING
+}
+MODEM_STATE_ENABLED = 6 # MM_MODEM_STATE_ENABLED
+MODEM_STATE_REGISTERED = 8 # MM_MODEM_STATE_REGISTERED
+
+# ofono network operator status: 3gpp network availability
+OPERATOR_STATUSES = {
+    'unknown': 0, # MM_MODEM_3GPP_NETWORK_AVAILABILITY_UNKNOWN
+    'available': 1, # MM_MODEM_3GPP_NETWORK_AVAILABILITY_AVAILABLE
+    'current': 2, # MM_MODEM_3GPP_NETWORK_AVAILABILITY_CURRENT
+    'forbidden': 3, # MM_MODEM_3GPP_NETWORK_AVAILABILITY_FORBIDDEN
+}
+
+# ofono context authentication method: bearer allowed auth
+ALLOWED_AUTH = {
+    'none': 1, # MM_BEARER_ALLOWED_AUTH_NONE
+    'pap': 2, # MM_BEARER_ALLOWED_AUTH_PAP
+    'chap': 3, # MM_BEARER_ALLOWED_AUTH_CHAP
+}
+ALLOWED_AUTH_UNKNOWN = 0 # MM_BEARER_ALLOWED_AUTH_UNKNOWN
+
+# ofono context settings method: bearer ip method
+IP_METHODS = {
+    'static': 2, # MM_BEARER_IP_METHOD_STATIC
+    'dhcp': 3, # MM_BEARER_IP_METHOD_DHCP
+}
+IP_METHOD_UNKNOWN = 0 # MM_BEARER_IP_METHOD_UNKNOWN
+
+# ofono radio technology: (capability, mode)
+TECHNOLOGY_MODES = {
+    'gsm': (4, 2), # MM_MODEM_CAPABILITY_GSM_UMTS, MM_MODEM_MODE_2G
+    'umts': (4, 4), # MM_MODEM_CAPABILITY_GSM_UMTS, MM_MODEM_MODE_3G
+    'lte': (8, 8), # MM_MODEM_CAPABILITY_LTE, MM_MODEM_MODE_4G
+    'nr': (16, 16), # MM_MODEM_MODE_5G
+}
+
+# ofono technology preference: preferred mode, and back
+TECHNOLOGY_PREFERENCES = {
+    'nr': 16, # MM_MODEM_MODE_5G
+    'lte': 8, # MM_MODEM_MODE_4G
+    'umts': 4, # MM_MODEM_MODE_3G
+    'gsm': 2, # MM_MODEM_MODE_2G
+}
+PREFERRED_TECHNOLOGIES = {mode: technology for technology, mode in TECHNOLOGY_PREFERENCES.items()}
+
+# available modes bitmask: supported (allowed, preferred) mode combinations
+SUPPORTED_MODES = {
+    30: [[30, 16], [14, 8], [6, 4], [2, 0]],
+    28: [[28, 0]],
+    26: [[26, 0]],
+    24: [[24, 0]],
+    22: [[22, 0]],
+    20: [[20, 0]],
+    18: [[18, 0]],
+    16: [[16, 0]],
+    14: [[14, 8], [6, 4], [2, 0]],
+    12: [[12, 8], [4, 0]],
+    10: [[10, 8], [2, 0]],
+    8: [[8, 0]],
+    6: [[6, 4], [2, 0]],
+    4: [[4, 0]],
+    2: [[2, 0]],
+}
+
+# ofono voicecall state: (call state, reason for entering it)
+CALL_STATES = {
+    'dialing': (1, 1), # MM_CALL_STATE_DIALING, MM_CALL_STATE_REASON_OUTGOING_STARTED
+    'alerting': (2, 1), # MM_CALL_STATE_RINGING_OUT, MM_CALL_STATE_REASON_OUTGOING_STARTED
+    'incoming': (3, 2), # MM_CALL_STATE_RINGING_IN, MM_CALL_STATE_REASON_INCOMING_NEW
+    'active': (4, 3), # MM_CALL_STATE_ACTIVE, MM_CALL_STATE_REASON_ACCEPTED
+    'held': (5, 0), # MM_CALL_STATE_HELD, MM_CALL_STATE_REASON_UNKNOWN
+    'waiting': (6, 2), # MM_CALL_STATE_WAITING, MM_CALL_STATE_REASON_INCOMING_NEW
+    'disconnected': (7, 4), # MM_CALL_STATE_TERMINATED, MM_CALL_STATE_REASON_TERMINATED
+}
+
+# ofono retries key: modem lock
+UNLOCK_RETRIES = {
+    'pin': 2, # MM_MODEM_LOCK_SIM_PIN
+    'pin2': 3, # MM_MODEM_LOCK_SIM_PIN2
+    'puk': 4, # MM_MODEM_LOCK_SIM_PUK
+    'puk2': 5, # MM_MODEM_LOCK_SIM_PUK2
+    'service': 6, # MM_MODEM_LOCK_PH_SP_PIN
+    'servicepuk': 7, # MM_MODEM_LOCK_PH_SP_PUK
+    'network': 8, # MM_MODEM_LOCK_PH_NET_PIN
+    'networkpuk': 9, # MM_MODEM_LOCK_PH_NET_PUK
+    'corp': 11, # MM_MODEM_LOCK_PH_CORP_PIN
+    'corppuk': 12, # MM_MODEM_LOCK_PH_CORP_PUK
+    'netsub': 15, # MM_MODEM_LOCK_PH_NETSUB_PIN
+    'netsubpuk': 16, # MM_MODEM_LOCK_PH_NETSUB_PUK
+}
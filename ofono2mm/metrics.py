@@ -0,0 +1,92 @@
+from dbus_next import Variant
+
+class Histogram:
+    """
+    Keeps the count, sum, minimum and maximum of the observed values,
+    along with how many of them fell into each bucket.
+
+    A value falls into the first bucket whose upper bound is greater or
+    equal to it, values above the last bound are only counted in 'count'.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        if self.count == 0 or value < self.min:
+            self.min = value
+        if self.count == 0 or value > self.max:
+            self.max = value
+
+        self.count += 1
+        self.sum += value
+
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+    def summary(self):
+        summary = {
+            'count': float(self.count),
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+        }
+
+        for bound, bucket_count in zip(self.buckets, self.bucket_counts):
+            summary[f'le_{bound}'] = float(bucket_count)
+
+        return summary
+
+class Metrics:
+    """
+    A registry of named counters and histograms.
+
+    Usage is as follows:
+
+    metrics.inc('voice.calls_added')
+    metrics.set('ofono_client.size', 12)
+    metrics.observe('voice.data_downtime_seconds', 2.5)
+
+    Gauges hold the last value set. Histograms are created on their first
+    observation, with the given bucket upper bounds (in seconds by
+    default).
+    """
+
+    default_buckets = [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+    def __init__(self):
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def set(self, name, value):
+        self.gauges[name] = value
+
+    def observe(self, name, value, buckets=None):
+        if name not in self.histograms:
+            self.histograms[name] = Histogram(buckets if buckets is not None else self.default_buckets)
+
+        self.histograms[name].observe(value)
+
+    def to_variants(self):
+        variants = {}
+        for name, value in self.counters.items():
+            variants[name] = Variant('t', value)
+        for name, value in self.gauges.items():
+            variants[name] = Variant('x', value)
+        for name, histogram in self.histograms.items():
+            variants[name] = Variant('a{sd}', histogram.summary())
+
+        return variants
+
+metrics = Metrics()
@@ -3,11 +3,12 @@ from dbus_next.service import (ServiceInterface,
 from dbus_next.constants import PropertyAccess
 from dbus_next import Variant, DBusError, BusType
 
-from ofono2mm.utils import async_retryable
+from ofono2mm.mappings import ALLOWED_AUTH, ALLOWED_AUTH_UNKNOWN, IP_METHODS
+from ofono2mm.utils import CoalescedServiceInterface
 
 import asyncio
 
-class MMBearerInterface(ServiceInterface):
+class MMBearerInterface(CoalescedServiceInterface):
     def __init__(self, index, bus, ofono_client, modem_name, ofono_modem, ofono_props, ofono_interfaces, ofono_interface_props, mm_modem):
         super().__init__('org.freedesktop.ModemManager1.Bearer')
         # print(f"Creating new bearer interface for {index}")
@@ -93,74 +94,54 @@ class MMBearerInterface(ServiceInterface):
     def Properties(self) -> 'a{sv}':
         return self.props['Properties'].value
 
-    async def set_props(self):
-        old_props = self.props.copy()
-        if 'org.ofono.ConnectionManager' in self.ofono_interface_props:
-            contexts = await self.ofono_interfaces['org.ofono.ConnectionManager'].call_get_contexts()
-            self.context_names = []
-            ctx_idx = 0
-            chosen_apn = None
-            chosen_ctx_path = None
-            for ctx in contexts:
-                name = ctx[1].get('Type', Variant('s', '')).value
-                access_point_name = ctx[1].get('AccessPointName', Variant('s', '')).value
-                auth_method = ctx[1].get('AuthenticationMethod', Variant('s', '')).value
-                username = ctx[1].get('Username', Variant('s', '')).value
-                password = ctx[1].get('Password', Variant('s', '')).value
-                if name.lower() == "internet":
-                    ctx_idx += 1
-                    if access_point_name:
-                        self.context_names.append(access_point_name)
-                        chosen_apn = access_point_name
-                        chosen_auth_method = auth_method
-                        chosen_username = username
-                        chosen_password = password
-                        chosen_ctx_path = ctx[0]
-
-            self.props['Properties'].value['apn'] = Variant('s', chosen_apn if chosen_apn != '' else '')
-            self.props['Properties'].value['user'] = Variant('s', chosen_username if chosen_username != '' else '')
-            self.props['Properties'].value['password'] = Variant('s', chosen_password if chosen_password != '' else '')
-
-            if chosen_auth_method == 'none':
-                self.props['Properties'].value['allowed-auth'] = Variant('u', 1) # none MM_BEARER_ALLOWED_AUTH_NONE
-            elif chosen_auth_method == 'pap':
-                self.props['Properties'].value['allowed-auth'] = Variant('u', 2) # pap MM_BEARER_ALLOWED_AUTH_PAP
-            elif chosen_auth_method == 'chap':
-                self.props['Properties'].value['allowed-auth'] = Variant('u', 3) # chap MM_BEARER_ALLOWED_AUTH_CHAP
-            else:
-                self.props['Properties'].value['allowed-auth'] = Variant('u', 0) # unknown MM_BEARER_ALLOWED_AUTH_UNKNOWN
-
-            ofono_interface = self.ofono_client["ofono_modem"][self.modem_name]['org.ofono.ConnectionManager']
-
-            roaming_allowed = None
-            connman_props = await ofono_interface.call_get_properties()
-
-            if connman_props.get('RoamingAllowed', Variant('b', True).value) != "":
-                roaming_allowed = connman_props.get('RoamingAllowed', Variant('b', True).value).value
-
-                if roaming_allowed == True:
-                    self.props['Properties'].value['roaming-allowance'] = Variant('u', 2) # roaming partner network MM_BEARER_ROAMING_ALLOWANCE_PARTNER
-                elif roaming_allowed == False:
-                    self.props['Properties'].value['roaming-allowance'] = Variant('u', 0) # roaming none MM_BEARER_ROAMING_ALLOWANCE_NONE
+    def set_props(self):
+        chosen_ctx_path = self.mm_modem.get_internet_context()
+        if chosen_ctx_path is None:
+            return
+
+        ctx = self.mm_modem.ofono_contexts[chosen_ctx_path]
+        chosen_apn = ctx.get('AccessPointName', Variant('s', '')).value
+        chosen_auth_method = ctx.get('AuthenticationMethod', Variant('s', '')).value
+        chosen_username = ctx.get('Username', Variant('s', '')).value
+        chosen_password = ctx.get('Password', Variant('s', '')).value
+
+        self.props['Properties'].value['apn'] = Variant('s', chosen_apn)
+        self.props['Properties'].value['user'] = Variant('s', chosen_username)
+        self.props['Properties'].value['password'] = Variant('s', chosen_password)
+
+        self.props['Properties'].value['allowed-auth'] = Variant('u', ALLOWED_AUTH.get(chosen_auth_method, ALLOWED_AUTH_UNKNOWN))
+
+        if 'org.ofono.ConnectionManager' in self.ofono_interface_props and 'RoamingAllowed' in self.ofono_interface_props['org.ofono.ConnectionManager']:
+            roaming_allowed = self.ofono_interface_props['org.ofono.ConnectionManager']['RoamingAllowed'].value
+
+            if roaming_allowed == True:
+                self.props['Properties'].value['roaming-allowance'] = Variant('u', 2) # roaming partner network MM_BEARER_ROAMING_ALLOWANCE_PARTNER
+            elif roaming_allowed == False:
+                self.props['Properties'].value['roaming-allowance'] = Variant('u', 0) # roaming none MM_BEARER_ROAMING_ALLOWANCE_NONE
 
     @method()
     async def Connect(self):
         await self.doConnect()
 
-    @async_retryable()
     async def doConnect(self):
         try:
-            await self.set_props()
+            await self.mm_modem.connect_retry_policy.run(self.activate_context)
         except Exception as e:
-            pass
+            raise DBusError('org.freedesktop.ModemManager1.Error.Core.Failed', f'Failed to activate the ofono context: {e}')
 
-        # print("Do connect")
-        ofono_ctx_interface = self.ofono_client["ofono_context"][self.ofono_ctx]['org.ofono.ConnectionContext']
-        await ofono_ctx_interface.call_set_property("Active", Variant('b', True))
+    async def reconnect(self):
+        await self.mm_modem.bearer_retry_policy.run(self.activate_context)
 
         # Clear the reconnection task
         self.reconnect_task = None
 
+    async def activate_context(self):
+        self.set_props()
+
+        # print("Do connect")
+        ofono_ctx_interface = self.ofono_client["ofono_context"][self.ofono_ctx]['org.ofono.ConnectionContext']
+        await ofono_ctx_interface.call_set_property("Active", Variant('b', True))
+
     @method()
     async def Disconnect(self):
         await self.doDisconnect()
@@ -176,6 +157,13 @@ class MMBearerInterface(ServiceInterface):
             finally:
                 self.reconnect_task = None
 
+    def teardown(self):
+        # the bearer is going away, stop retrying to activate its context
+        self.disconnecting = True
+        if self.reconnect_task is not None:
+            self.reconnect_task.cancel()
+            self.reconnect_task = None
+
     async def doDisconnect(self):
         self.disconnecting = True
 
@@ -198,7 +186,7 @@ class MMBearerInterface(ServiceInterface):
             if self.disconnecting and (not value.value):
                 self.disconnecting = False
             elif not self.disconnecting and (not value.value) and self.reconnect_task is None and self.props['Connected'].value:
-                self.reconnect_task = asyncio.create_task(self.doConnect())
+                self.reconnect_task = asyncio.create_task(self.reconnect())
 
             self.props['Connected'] = value
             self.emit_properties_changed({'Connected': value.value})
@@ -208,11 +196,8 @@ class MMBearerInterface(ServiceInterface):
                 self.emit_properties_changed({'Interface': value.value['Interface'].value})
                 if [value.value['Interface'].value, 2] not in self.mm_modem.props['Ports'].value:
                     self.mm_modem.props['Ports'].value.append([value.value['Interface'].value, 2]) # port type AT MM_MODEM_PORT_TYPE_AT
-            if 'Method' in value.value:
-                if value.value['Method'].value == 'static':
-                    self.props['Ip4Config'].value['method'] = Variant('u', 2) # static MM_BEARER_IP_METHOD_STATIC
-                if value.value['Method'].value == 'dhcp':
-                    self.props['Ip4Config'].value['method'] = Variant('u', 3) # dhcp MM_BEARER_IP_METHOD_DHCP
+            if 'Method' in value.value and value.value['Method'].value in IP_METHODS:
+                self.props['Ip4Config'].value['method'] = Variant('u', IP_METHODS[value.value['Method'].value])
             if 'Address' in value.value:
                 self.props['Ip4Config'].value['address'] = value.value['Address']
             if 'DomainNameServers' in value.value:
@@ -222,15 +207,3 @@ class MMBearerInterface(ServiceInterface):
                 self.props['Ip4Config'].value['gateway'] = value.value['Gateway']
 
             self.emit_properties_changed({'Ip4Config': self.props['Ip4Config'].value})
-
-    def ofono_changed(self, name, varval):
-        self.ofono_props[name] = varval
-        self.set_props()
-
-    def ofono_interface_changed(self, iface):
-        def ch(name, varval):
-            if iface in self.ofono_interface_props:
-                self.ofono_interface_props[iface][name] = varval
-            self.set_props()
-
-        return ch
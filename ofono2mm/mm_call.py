@@ -2,7 +2,13 @@ from dbus_next.service import ServiceInterface, method, dbus_property, signal
 from dbus_next.constants import PropertyAccess
 from dbus_next import Variant
 
-class MMCallInterface(ServiceInterface):
+from ofono2mm.mappings import CALL_STATES
+from ofono2mm.metrics import metrics
+from ofono2mm.utils import CoalescedServiceInterface, SignalSubscriptions
+
+import time
+
+class MMCallInterface(CoalescedServiceInterface):
     def __init__(self, index, bus, ofono_client, modem_name, ofono_modem, ofono_props, ofono_interfaces, ofono_interface_props):
         super().__init__('org.freedesktop.ModemManager1.Call')
         self.index = index
@@ -15,6 +21,8 @@ class MMCallInterface(ServiceInterface):
         self.ofono_interfaces = ofono_interfaces
         self.ofono_interface_props = ofono_interface_props
         self.voicecall = '/'
+        self.ringing_since = None
+        self.subscriptions = SignalSubscriptions()
         self.props = {
             'State': Variant('u', 0), # on runtime unknown MM_CALL_STATE_UNKNOWN
             'StateReason': Variant('u', 0), # on runtime unknown MM_CALL_STATE_REASON_UNKNOWN
@@ -29,17 +37,52 @@ class MMCallInterface(ServiceInterface):
             })
         }
 
+    def start_tracking(self):
+        if self.props['State'].value in (3, 6): # MM_CALL_STATE_RINGING_IN, MM_CALL_STATE_WAITING
+            self.ringing_since = time.monotonic()
+
+        if self.voicecall != '/':
+            self.subscriptions.on(self.ofono_client["ofono_modem"][self.voicecall]['org.ofono.VoiceCall'], 'property_changed', self.ofono_call_changed)
+
+    def stop_tracking(self):
+        self.subscriptions.clear()
+        self.set_state(7, 4) # MM_CALL_STATE_TERMINATED, MM_CALL_STATE_REASON_TERMINATED
+        # the call object is unexported right after, send the final state while it is still there
+        self.flush_properties_changed()
+
+    def ofono_call_changed(self, name, varval):
+        if name == 'State' and varval.value in CALL_STATES:
+            state, reason = CALL_STATES[varval.value]
+            self.set_state(state, reason)
+        elif name == 'Multiparty' and varval.value != self.props['Multiparty'].value:
+            self.props['Multiparty'] = varval
+            self.emit_properties_changed({'Multiparty': varval.value})
+
+    def set_state(self, state, reason):
+        old_state = self.props['State'].value
+        if state == old_state:
+            return
+
+        if state == 4 and self.ringing_since is not None: # MM_CALL_STATE_ACTIVE
+            metrics.observe('voice.answer_latency_seconds', time.monotonic() - self.ringing_since)
+        if state not in (3, 6): # MM_CALL_STATE_RINGING_IN, MM_CALL_STATE_WAITING
+            self.ringing_since = None
+
+        self.props['State'] = Variant('u', state)
+        self.props['StateReason'] = Variant('u', reason)
+        self.StateChanged(old_state, state, reason)
+        self.emit_properties_changed({'State': state, 'StateReason': reason})
+
     @method()
     def Start(self):
-        self.props['State'] = Variant('u', 4) # active MM_CALL_STATE_ACTIVE
-        self.props['StateReason'] = Variant('u', 1) # accepted MM_CALL_STATE_REASON_OUTGOING_STARTED
+        # the call is dialed by CreateCall, from then on its state follows the ofono voicecall
+        pass
 
     @method()
     async def Accept(self):
         ofono_interface = self.ofono_client["ofono_modem"][self.voicecall]['org.ofono.VoiceCall']
         await ofono_interface.call_answer()
-        self.props['State'] = Variant('u', 4) # active MM_CALL_STATE_ACTIVE
-        self.props['StateReason'] = Variant('u', 3) # accepted MM_CALL_STATE_REASON_ACCEPTED
+        self.set_state(4, 3) # MM_CALL_STATE_ACTIVE, MM_CALL_STATE_REASON_ACCEPTED
 
     @method()
     async def Deflect(self, number: 's'):
@@ -51,19 +94,23 @@ class MMCallInterface(ServiceInterface):
     async def JoinMultiparty(self):
         await self.ofono_interfaces['org.ofono.VoiceCallManager'].call_create_multiparty()
         self.props['Multiparty'] = Variant('b', True)
+        self.emit_properties_changed({'Multiparty': True})
 
     @method()
     async def LeaveMultiparty(self):
         await self.ofono_interfaces['org.ofono.VoiceCallManager'].call_hangup_multiparty()
         self.props['Multiparty'] = Variant('b', False)
+        self.emit_properties_changed({'Multiparty': False})
 
     @method()
     async def Hangup(self):
-        # ofono_interface = self.ofono_client["ofono_modem"][self.voicecall]['org.ofono.VoiceCall']
-        # await ofono_interface.call_hangup()
-        await self.ofono_interfaces['org.ofono.VoiceCallManager'].call_hangup_all()
-        self.props['State'] = Variant('u', 7) # terminated MM_CALL_STATE_TERMINATED
-        self.props['StateReason'] = Variant('u', 4) # terminated MM_CALL_STATE_REASON_TERMINATED
+        # only this call, a waiting call or another leg of a conference stays up
+        if self.voicecall != '/':
+            ofono_interface = self.ofono_client["ofono_modem"][self.voicecall]['org.ofono.VoiceCall']
+            await ofono_interface.call_hangup()
+        else:
+            await self.ofono_interfaces['org.ofono.VoiceCallManager'].call_hangup_all()
+        self.set_state(7, 4) # MM_CALL_STATE_TERMINATED, MM_CALL_STATE_REASON_TERMINATED
 
     @method()
     async def SendDtmf(self, dtmf: 's'):
@@ -18,12 +18,14 @@ from ofono2mm.mm_modem_location import MMModemLocationInterface
 from ofono2mm.mm_sim import MMSimInterface
 from ofono2mm.mm_bearer import MMBearerInterface
 from ofono2mm.mm_modem_voice import MMModemVoiceInterface
+from ofono2mm.ofono_state import OfonoState
+from ofono2mm.object_paths import object_paths
+from ofono2mm.mappings import ACCESS_TECHNOLOGIES, MODEM_STATES, MODEM_STATE_ENABLED, IP_METHODS, IP_METHOD_UNKNOWN, TECHNOLOGY_MODES, TECHNOLOGY_PREFERENCES, PREFERRED_TECHNOLOGIES, SUPPORTED_MODES, UNLOCK_RETRIES
+from ofono2mm.utils import CoalescedServiceInterface, RetryPolicy, SignalSubscriptions
 
 import asyncio
 
-bearer_i = 0
-
-class MMModemInterface(ServiceInterface):
+class MMModemInterface(CoalescedServiceInterface):
     def __init__(self, loop, index, bus, ofono_client, modem_name):
         super().__init__('org.freedesktop.ModemManager1.Modem')
         self.loop = loop
@@ -33,18 +35,36 @@ class MMModemInterface(ServiceInterface):
         self.ofono_proxy = self.ofono_client["ofono_modem"][modem_name]
         self.modem_name = modem_name
         self.ofono_modem = self.ofono_proxy['org.ofono.Modem']
-        self.ofono_props = {}
+        self.ofono_state = OfonoState()
+        self.ofono_props = self.ofono_state.props
         self.ofono_interfaces = {}
-        self.ofono_interface_props = {}
+        self.ofono_interface_props = self.ofono_state.interface_props
         self.mm_cell_type = 0 # on runtime unknown MM_CELL_TYPE_UNKNOWN
         self.mm_modem3gpp_interface = False
         self.mm_modem_messaging_interface = False
+        self.mm_modem3gpp_ussd_interface = False
+        self.mm_modem_time_interface = False
+        self.mm_modem_voice_interface = False
+        self.mm_modem_signal_interface = False
+        self.mm_modem_location_interface = False
         self.mm_sim_interface = False
-        self.sim = Variant('o', f'/org/freedesktop/ModemManager/SIM/{self.index}')
+        self.modem_interfaces = []
+        self.sim = Variant('o', f'/org/freedesktop/ModemManager1/SIM/{self.index}')
         self.bearers = {}
+        self.ofono_contexts = {}
+        self.ofono_context_handlers = {}
+        self.ofono_interface_handlers = {}
+        self.subscriptions = SignalSubscriptions()
+        self.ofono_context_waiters = {}
+        # reconnecting in the background keeps trying, a client asking to connect gets an answer in time
+        self.bearer_retry_policy = RetryPolicy('bearer_connect')
+        self.connect_retry_policy = RetryPolicy('bearer_connect_request', max_delay=8, max_attempts=3, failure_threshold=0)
+        self.init_timings = {}
+        self.ofono_state.subscribe([ofono_input for ofono_input in self.prop_updaters if ofono_input[0] is not None], self.ofono_state_changed)
+        self.ofono_state.subscribe([('org.ofono.NetworkRegistration', 'Status')], self.ofono_registration_changed)
         self.props = {
             'Sim': Variant('o', '/'),
-            'SimSlots': Variant('ao', [f'/org/freedesktop/ModemManager/SIM/{self.index}']),
+            'SimSlots': Variant('ao', [f'/org/freedesktop/ModemManager1/SIM/{self.index}']),
             'PrimarySimSlot': Variant('u', 0),
             'Bearers': Variant('ao', []),
             'SupportedCapabilities': Variant('au', [0]), # on runtime none MM_MODEM_CAPABILITY_NONE
@@ -82,10 +102,7 @@ class MMModemInterface(ServiceInterface):
         }
 
     async def init_ofono_interfaces(self):
-        for iface in self.ofono_props['Interfaces'].value:
-            await self.add_ofono_interface(iface)
-
-        await self.check_ofono_contexts()
+        await asyncio.gather(*[self.add_ofono_interface(iface) for iface in self.ofono_props['Interfaces'].value])
 
     async def add_ofono_interface(self, iface):
         self.ofono_interfaces.update({
@@ -93,34 +110,17 @@ class MMModemInterface(ServiceInterface):
         })
 
         try:
-            self.ofono_interface_props.update({
-                iface: await self.ofono_interfaces[iface].call_get_properties()
-            })
-
-            if self.mm_modem3gpp_interface:
-                self.mm_modem3gpp_interface.ofono_interface_props = self.ofono_interface_props.copy()
-            if self.mm_sim_interface:
-                self.mm_sim_interface.ofono_interface_props = self.ofono_interface_props.copy()
-
-            self.ofono_interfaces[iface].on_property_changed(self.ofono_interface_changed(iface))
+            props = await self.ofono_interfaces[iface].call_get_properties()
         except DBusError:
-            self.ofono_interface_props.update({
-                iface: {}
-            })
-
-            if self.mm_modem3gpp_interface:
-                self.mm_modem3gpp_interface.ofono_interface_props = self.ofono_interface_props.copy()
-            if self.mm_sim_interface:
-                self.mm_sim_interface.ofono_interface_props = self.ofono_interface_props.copy()
-
-            self.ofono_interfaces[iface].on_property_changed(self.ofono_interface_changed(iface))
+            props = {}
         except AttributeError:
-            pass
+            props = None
+
+        if props is not None:
+            handler = self.ofono_interface_handlers.setdefault(iface, self.ofono_interface_changed(iface))
+            self.subscriptions.on(self.ofono_interfaces[iface], 'property_changed', handler)
+            self.ofono_state.set_interface(iface, props)
 
-        if self.mm_modem3gpp_interface:
-            self.mm_modem3gpp_interface.set_props()
-        if self.mm_sim_interface:
-            self.mm_sim_interface.set_props()
         if self.mm_modem_messaging_interface and iface == "org.ofono.MessageManager":
             self.mm_modem_messaging_interface.set_props()
             await self.mm_modem_messaging_interface.init_messages()
@@ -130,105 +130,145 @@ class MMModemInterface(ServiceInterface):
     async def remove_ofono_interface(self, iface):
         if iface in self.ofono_interfaces:
             self.ofono_interfaces.pop(iface)
-        if iface in self.ofono_interface_props:
-            self.ofono_interface_props.pop(iface)
 
-        self.set_props()
+        self.subscriptions.clear(self.ofono_proxy[iface])
+        if iface == "org.ofono.ConnectionManager":
+            # the bearers go with their contexts, they are exported again once the connection manager is back
+            for path in list(self.ofono_contexts):
+                self.ofono_context_removed(path)
+
+        self.ofono_state.remove_interface(iface)
+
+    def clear_subscriptions(self):
+        # detach every ofono signal handler of the modem and its interfaces, ahead of unexporting them
+        self.subscriptions.clear()
+        for interface in [self.mm_modem3gpp_ussd_interface, self.mm_modem_messaging_interface, self.mm_modem_time_interface, self.mm_modem_voice_interface]:
+            if interface:
+                interface.subscriptions.clear()
+
+        if self.mm_modem_voice_interface:
+            for mm_call_interface in self.mm_modem_voice_interface.calls.values():
+                mm_call_interface.subscriptions.clear()
+
+    def export_modem_interface(self, interface):
+        self.bus.export(f'/org/freedesktop/ModemManager1/Modem/{self.index}', interface)
+        self.modem_interfaces.append(interface)
+
+    def teardown(self):
+        # unexport the modem with its sim, bearers, messages and calls once its ofono modem is gone
+        self.clear_subscriptions()
+
+        for interface in [self.mm_modem_signal_interface, self.mm_modem_location_interface, self.mm_modem_voice_interface, self.mm_modem_messaging_interface]:
+            if interface:
+                interface.teardown()
+
+        for path, mm_bearer_interface in self.bearers.items():
+            mm_bearer_interface.teardown()
+            self.bus.unexport(path, mm_bearer_interface)
+
+        self.bearers.clear()
+        object_paths.release_all(self)
+        self.ofono_contexts.clear()
+        self.ofono_context_handlers.clear()
 
-        if self.mm_modem3gpp_interface:
-            self.mm_modem3gpp_interface.ofono_interface_props = self.ofono_interface_props.copy()
-            self.mm_modem3gpp_interface.set_props()
         if self.mm_sim_interface:
-            self.mm_sim_interface.ofono_interface_props = self.ofono_interface_props.copy()
-            self.mm_sim_interface.set_props()
+            self.bus.unexport(f'/org/freedesktop/ModemManager1/SIM/{self.index}', self.mm_sim_interface)
+
+        # only our own interfaces, the same modem might already be exported again at this path
+        for interface in self.modem_interfaces:
+            self.bus.unexport(f'/org/freedesktop/ModemManager1/Modem/{self.index}', interface)
+
+        self.modem_interfaces = []
 
     async def init_mm_sim_interface(self):
         self.mm_sim_interface = MMSimInterface(self.index, self.bus, self.ofono_client, self.modem_name, self.ofono_modem, self.ofono_props, self.ofono_interfaces, self.ofono_interface_props)
-        self.bus.export(f'/org/freedesktop/ModemManager/SIM/{self.index}', self.mm_sim_interface)
+        self.bus.export(f'/org/freedesktop/ModemManager1/SIM/{self.index}', self.mm_sim_interface)
+        self.ofono_state.subscribe(self.mm_sim_interface.ofono_inputs, self.mm_sim_interface.ofono_state_changed)
         self.mm_sim_interface.set_props()
 
     async def init_mm_3gpp_interface(self):
         self.mm_modem3gpp_interface = MMModem3gppInterface(self.index, self.bus, self.ofono_client, self.modem_name, self.ofono_modem, self.ofono_props, self.ofono_interfaces, self.ofono_interface_props)
-        self.bus.export(f'/org/freedesktop/ModemManager1/Modem/{self.index}', self.mm_modem3gpp_interface)
+        self.export_modem_interface(self.mm_modem3gpp_interface)
+        self.ofono_state.subscribe(self.mm_modem3gpp_interface.ofono_inputs, self.mm_modem3gpp_interface.ofono_state_changed)
         self.mm_modem3gpp_interface.set_props()
 
     async def init_mm_3gpp_ussd_interface(self):
         self.mm_modem3gpp_ussd_interface = MMModem3gppUssdInterface(self.index, self.bus, self.ofono_client, self.modem_name, self.ofono_modem, self.ofono_props, self.ofono_interfaces, self.ofono_interface_props)
-        self.bus.export(f'/org/freedesktop/ModemManager1/Modem/{self.index}', self.mm_modem3gpp_ussd_interface)
+        self.export_modem_interface(self.mm_modem3gpp_ussd_interface)
 
     async def init_mm_3gpp_profile_manager_interface(self):
         self.mm_modem3gpp_profile_manager_interface = MMModem3gppProfileManagerInterface(self.index, self.bus, self.ofono_client, self.modem_name, self.ofono_modem, self.ofono_props, self.ofono_interfaces, self.ofono_interface_props)
-        self.bus.export(f'/org/freedesktop/ModemManager1/Modem/{self.index}', self.mm_modem3gpp_profile_manager_interface)
+        self.export_modem_interface(self.mm_modem3gpp_profile_manager_interface)
 
     async def init_mm_simple_interface(self):
         self.mm_modem_simple_interface = MMModemSimpleInterface(self, self.ofono_interfaces, self.ofono_interface_props)
-        self.bus.export(f'/org/freedesktop/ModemManager1/Modem/{self.index}', self.mm_modem_simple_interface)
+        self.export_modem_interface(self.mm_modem_simple_interface)
 
     async def init_mm_firmware_interface(self):
         self.mm_modem_firmware_interface = MMModemFirmwareInterface(self)
-        self.bus.export(f'/org/freedesktop/ModemManager1/Modem/{self.index}', self.mm_modem_firmware_interface)
+        self.export_modem_interface(self.mm_modem_firmware_interface)
         self.mm_modem_firmware_interface.set_props()
 
     async def init_mm_time_interface(self):
         self.mm_modem_time_interface = MMModemTimeInterface(self.index, self.bus, self.ofono_client, self.modem_name, self.ofono_modem, self.ofono_props, self.ofono_interfaces, self.ofono_interface_props)
-        self.bus.export(f'/org/freedesktop/ModemManager1/Modem/{self.index}', self.mm_modem_time_interface)
+        self.export_modem_interface(self.mm_modem_time_interface)
 
         if 'org.ofono.NetworkTime' in self.ofono_interfaces:
             await self.mm_modem_time_interface.init_time()
 
     async def init_mm_cdma_interface(self):
         self.mm_modem_cdma_interface = MMModemCDMAInterface(self)
-        self.bus.export(f'/org/freedesktop/ModemManager1/Modem/{self.index}', self.mm_modem_cdma_interface)
+        self.export_modem_interface(self.mm_modem_cdma_interface)
 
     async def init_mm_sar_interface(self):
         self.mm_modem_sar_interface = MMModemSarInterface(self)
-        self.bus.export(f'/org/freedesktop/ModemManager1/Modem/{self.index}', self.mm_modem_sar_interface)
+        self.export_modem_interface(self.mm_modem_sar_interface)
 
     async def init_mm_oma_interface(self):
         self.mm_modem_oma_interface = MMModemOmaInterface(self)
-        self.bus.export(f'/org/freedesktop/ModemManager1/Modem/{self.index}', self.mm_modem_oma_interface)
+        self.export_modem_interface(self.mm_modem_oma_interface)
 
     async def init_mm_signal_interface(self):
         self.mm_modem_signal_interface = MMModemSignalInterface(self, self.ofono_interfaces, self.ofono_interface_props)
-        self.bus.export(f'/org/freedesktop/ModemManager1/Modem/{self.index}', self.mm_modem_signal_interface)
+        self.export_modem_interface(self.mm_modem_signal_interface)
 
     async def init_mm_location_interface(self):
         self.mm_modem_location_interface = MMModemLocationInterface(self)
-        self.bus.export(f'/org/freedesktop/ModemManager1/Modem/{self.index}', self.mm_modem_location_interface)
+        self.export_modem_interface(self.mm_modem_location_interface)
 
     async def init_mm_voice_interface(self):
-        self.mm_modem_voice_interface = MMModemVoiceInterface(self.index, self.bus, self.ofono_client, self.modem_name, self.ofono_modem, self.ofono_props, self.ofono_interfaces, self.ofono_interface_props)
-        self.bus.export(f'/org/freedesktop/ModemManager1/Modem/{self.index}', self.mm_modem_voice_interface)
+        self.mm_modem_voice_interface = MMModemVoiceInterface(self.index, self.bus, self.ofono_client, self.modem_name, self.ofono_modem, self.ofono_props, self.ofono_interfaces, self.ofono_interface_props, self)
+        self.export_modem_interface(self.mm_modem_voice_interface)
+        self.ofono_state.subscribe(self.mm_modem_voice_interface.ofono_inputs, self.mm_modem_voice_interface.ofono_state_changed)
+        self.mm_modem_voice_interface.set_props()
 
         if 'org.ofono.VoiceCallManager' in self.ofono_interfaces:
-            self.mm_modem_voice_interface.set_props()
             await self.mm_modem_voice_interface.init_calls()
 
     async def init_mm_messaging_interface(self):
         self.mm_modem_messaging_interface = MMModemMessagingInterface(self.index, self.bus, self.ofono_client, self.modem_name, self.ofono_modem, self.ofono_props, self.ofono_interfaces, self.ofono_interface_props)
-        self.bus.export(f'/org/freedesktop/ModemManager1/Modem/{self.index}', self.mm_modem_messaging_interface)
+        self.export_modem_interface(self.mm_modem_messaging_interface)
 
         if 'org.ofono.MessageManager' in self.ofono_interfaces:
             self.mm_modem_messaging_interface.set_props()
             await self.mm_modem_messaging_interface.init_messages()
 
     async def check_ofono_contexts(self):
-        global bearer_i
         if not 'org.ofono.ConnectionManager' in self.ofono_interfaces:
             return
 
         contexts = await self.ofono_interfaces['org.ofono.ConnectionManager'].call_get_contexts();
-        old_bearer_list = self.props['Bearers'].value
+        for ctx in contexts:
+            self.add_ofono_context(ctx[0], ctx[1])
+
+        old_bearer_list = list(self.props['Bearers'].value)
         for ctx in contexts:
             if ctx[1]['Type'].value == "internet":
                 mm_bearer_interface = MMBearerInterface(self.index, self.bus, self.ofono_client, self.modem_name, self.ofono_modem, self.ofono_props, self.ofono_interfaces, self.ofono_interface_props, self)
 
-                ip_method = 0
+                ip_method = IP_METHOD_UNKNOWN
                 if 'Method' in ctx[1]['Settings'].value:
-                    if ctx[1]['Settings'].value['Method'].value == "static":
-                        ip_method = 2
-                    if ctx[1]['Settings'].value['Method'].value == "dhcp":
-                        ip_method = 3
+                    ip_method = IP_METHODS.get(ctx[1]['Settings'].value['Method'].value, IP_METHOD_UNKNOWN)
 
                 ip_address = ''
                 if 'Address' in ctx[1]['Settings'].value:
@@ -262,29 +302,109 @@ class MMModemInterface(ServiceInterface):
                     self.emit_properties_changed({'Ports': self.props['Ports'].value})
 
                 ofono_ctx_interface = self.ofono_client["ofono_context"][ctx[0]]["org.ofono.ConnectionContext"]
-                ofono_ctx_interface.on_property_changed(mm_bearer_interface.ofono_context_changed)
+                self.subscriptions.on(ofono_ctx_interface, 'property_changed', mm_bearer_interface.ofono_context_changed)
                 mm_bearer_interface.ofono_ctx = ctx[0]
-                self.bus.export(f'/org/freedesktop/ModemManager/Bearer/{bearer_i}', mm_bearer_interface)
-                self.props['Bearers'].value.append(f'/org/freedesktop/ModemManager/Bearer/{bearer_i}')
-                self.bearers[f'/org/freedesktop/ModemManager/Bearer/{bearer_i}'] = mm_bearer_interface
-                bearer_i += 1
+                self.export_bearer(mm_bearer_interface)
 
-        if self.props['Bearers'].value == old_bearer_list:
+        if self.props['Bearers'].value != old_bearer_list:
             self.emit_properties_changed({'Bearers': self.props['Bearers'].value})
 
-        self.ofono_interfaces['org.ofono.ConnectionManager'].on_context_added(self.ofono_context_added)
+        self.subscriptions.on(self.ofono_interfaces['org.ofono.ConnectionManager'], 'context_added', self.ofono_context_added)
+        self.subscriptions.on(self.ofono_interfaces['org.ofono.ConnectionManager'], 'context_removed', self.ofono_context_removed)
+
+    def add_ofono_context(self, path, properties):
+        self.ofono_contexts[path] = properties
+        if path not in self.ofono_context_handlers:
+            self.ofono_context_handlers[path] = self.ofono_context_changed(path)
+            self.subscriptions.on(self.ofono_client["ofono_context"][path]['org.ofono.ConnectionContext'], 'property_changed', self.ofono_context_handlers[path])
+
+    def export_bearer(self, mm_bearer_interface):
+        path = object_paths.allocate('Bearer', self)
+        self.bus.export(path, mm_bearer_interface)
+        self.props['Bearers'].value.append(path)
+        self.bearers[path] = mm_bearer_interface
+        return path
+
+    def remove_bearer(self, path):
+        if path not in self.bearers:
+            return
+
+        mm_bearer_interface = self.bearers.pop(path)
+        mm_bearer_interface.teardown()
+        self.bus.unexport(path, mm_bearer_interface)
+        object_paths.release(path)
+        if path in self.props['Bearers'].value:
+            self.props['Bearers'].value.remove(path)
+
+        self.emit_properties_changed({'Bearers': self.props['Bearers'].value})
+
+    def remove_ofono_context(self, path):
+        self.ofono_contexts.pop(path, None)
+        self.ofono_context_handlers.pop(path, None)
+
+        # drops the bearer handlers on the context as well
+        self.subscriptions.clear(self.ofono_client["ofono_context"][path]['org.ofono.ConnectionContext'])
+        self.ofono_client.evict(path)
+
+    def ofono_context_changed(self, path):
+        def ch(name, varval):
+            if path in self.ofono_contexts:
+                self.ofono_contexts[path][name] = varval
+
+            if name == "Active" and varval.value:
+                for waiter in self.ofono_context_waiters.pop(path, []):
+                    if not waiter.done():
+                        waiter.set_result(True)
+
+        return ch
+
+    async def wait_ofono_context_active(self, path, timeout):
+        if path in self.ofono_contexts and self.ofono_contexts[path].get('Active', Variant('b', False)).value:
+            return True
+
+        waiter = self.loop.create_future()
+        self.ofono_context_waiters.setdefault(path, []).append(waiter)
+        try:
+            return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            if waiter in self.ofono_context_waiters.get(path, []):
+                self.ofono_context_waiters[path].remove(waiter)
+
+    def get_internet_context(self):
+        # the last internet context with an apn set is the one to use, same as ofono's own scripts
+        chosen_ctx_path = None
+        for path, props in self.ofono_contexts.items():
+            if props.get('Type', Variant('s', '')).value.lower() == "internet" and props.get('AccessPointName', Variant('s', '')).value:
+                chosen_ctx_path = path
+
+        return chosen_ctx_path
+
+    def context_bearer(self, path):
+        for bearer_path, mm_bearer_interface in self.bearers.items():
+            if mm_bearer_interface.ofono_ctx == path:
+                return bearer_path
+
+        return None
+
+    def ofono_context_removed(self, path):
+        bearer_path = self.context_bearer(path)
+        if bearer_path is not None:
+            self.remove_bearer(bearer_path)
+
+        self.remove_ofono_context(path)
 
     def ofono_context_added(self, path, properties):
-        global bearer_i
-        if properties['Type'] == "internet":
+        self.add_ofono_context(path, properties)
+
+        # contexts added through CreateBearer might already have their bearer
+        if properties['Type'].value == "internet" and self.context_bearer(path) is None:
             mm_bearer_interface = MMBearerInterface(self.index, self.bus, self.ofono_client, self.modem_name, self.ofono_modem, self.ofono_props, self.ofono_interfaces, self.ofono_interface_props, self)
 
-            ip_method = 0
+            ip_method = IP_METHOD_UNKNOWN
             if 'Method' in properties['Settings'].value:
-                if properties['Settings'].value['Method'].value == "static":
-                    ip_method = 2
-                elif properties['Settings'].value['Method'].value == "dhcp":
-                    ip_method = 3
+                ip_method = IP_METHODS.get(properties['Settings'].value['Method'].value, IP_METHOD_UNKNOWN)
 
             ip_address = ''
             if 'Address' in properties['Settings'].value:
@@ -318,300 +438,190 @@ class MMModemInterface(ServiceInterface):
                 self.emit_properties_changed({'Ports': self.props['Ports'].value})
 
             ofono_ctx_interface = self.ofono_client["ofono_context"][path]['org.ofono.ConnectionContext']
-            ofono_ctx_interface.on_property_changed(mm_bearer_interface.ofono_context_changed)
+            self.subscriptions.on(ofono_ctx_interface, 'property_changed', mm_bearer_interface.ofono_context_changed)
             mm_bearer_interface.ofono_ctx = path
-            self.bus.export(f'/org/freedesktop/ModemManager/Bearer/{bearer_i}', mm_bearer_interface)
-            self.props['Bearers'].value.append(f'/org/freedesktop/ModemManager/Bearer/{bearer_i}')
-            self.bearers[f'/org/freedesktop/ModemManager/Bearer/{bearer_i}'] = mm_bearer_interface
-            bearer_i += 1
+            self.export_bearer(mm_bearer_interface)
             self.emit_properties_changed({'Bearers': self.props['Bearers'].value})
 
-    def set_props(self):
-        old_props = self.props.copy()
+    # the ofono (interface, property) inputs each group of modem properties is derived from,
+    # a None interface stands for a modem property that other groups are derived from
+    prop_updaters = {
+        ('org.ofono.Modem', 'Powered'): ['update_state'],
+        ('org.ofono.Modem', 'Online'): ['update_state'],
+        ('org.ofono.Modem', 'Serial'): ['update_identity'],
+        ('org.ofono.Modem', 'Revision'): ['update_identity'],
+        ('org.ofono.Modem', 'SoftwareVersionNumber'): ['update_identity'],
+        ('org.ofono.Modem', 'Manufacturer'): ['update_identity'],
+        ('org.ofono.Modem', 'Model'): ['update_identity'],
+        ('org.ofono.SimManager', 'Present'): ['update_state'],
+        ('org.ofono.SimManager', 'PinRequired'): ['update_state'],
+        ('org.ofono.SimManager', 'SubscriberNumbers'): ['update_own_numbers'],
+        ('org.ofono.SimManager', 'Retries'): ['update_unlock_retries'],
+        ('org.ofono.NetworkRegistration', 'Status'): ['update_state'],
+        ('org.ofono.NetworkRegistration', 'Strength'): ['update_signal_quality'],
+        ('org.ofono.NetworkRegistration', 'Technology'): ['update_access_technologies'],
+        ('org.ofono.RadioSettings', 'AvailableTechnologies'): ['update_modes'],
+        ('org.ofono.RadioSettings', 'TechnologyPreference'): ['update_modes'],
+        (None, 'State'): ['update_signal_quality', 'update_access_technologies'],
+    }
+
+    # every group in the order a full recomputation runs them
+    all_prop_updaters = [
+        'update_state',
+        'update_signal_quality',
+        'update_access_technologies',
+        'update_own_numbers',
+        'update_unlock_retries',
+        'update_modes',
+        'update_identity',
+    ]
+
+    def set_props(self, ofono_input=None):
+        if ofono_input is None:
+            pending = list(self.all_prop_updaters)
+        else:
+            pending = list(self.prop_updaters.get(ofono_input, []))
+
         old_state = self.props['State'].value
-        self.props['UnlockRequired'] = Variant('u', 1) # modem is unlocked MM_MODEM_LOCK_NONE
+        changed_props = {}
+        while pending:
+            updater = pending.pop(0)
+            for prop, value in getattr(self, updater)().items():
+                if value.value != self.props[prop].value:
+                    changed_props[prop] = value.value
+                    for dependent in self.prop_updaters.get((None, prop), []):
+                        if dependent not in pending:
+                            pending.append(dependent)
+
+                self.props[prop] = value
+
+        if old_state != self.props['State'].value:
+            self.StateChanged(old_state, self.props['State'].value, 1)
+
+        if changed_props:
+            self.emit_properties_changed(changed_props)
+
+    def update_state(self):
+        props = {'UnlockRequired': Variant('u', 1)} # modem is unlocked MM_MODEM_LOCK_NONE
         if self.ofono_props['Powered'].value and 'org.ofono.SimManager' in self.ofono_interface_props:
             if 'Present' in self.ofono_interface_props['org.ofono.SimManager']:
                 if self.ofono_interface_props['org.ofono.SimManager']['Present'].value and 'PinRequired' in self.ofono_interface_props['org.ofono.SimManager']:
                     if self.ofono_interface_props['org.ofono.SimManager']['PinRequired'].value == 'none':
-                        self.props['UnlockRequired'] = Variant('u', 1) # modem is unlocked MM_MODEM_LOCK_NONE
                         if self.ofono_props['Online'].value:
                             if 'org.ofono.NetworkRegistration' in self.ofono_interface_props:
                                 if ("Status" in self.ofono_interface_props['org.ofono.NetworkRegistration']):
-                                    if self.ofono_interface_props['org.ofono.NetworkRegistration']['Status'].value == 'registered' or self.ofono_interface_props['org.ofono.NetworkRegistration']['Status'].value == 'roaming':
-                                        self.props['State'] = Variant('i', 8) # modem is registered MM_MODEM_STATE_REGISTERED
-                                        if 'Strength' in self.ofono_interface_props['org.ofono.NetworkRegistration']:
-                                            self.props['SignalQuality'] = Variant('(ub)', [self.ofono_interface_props['org.ofono.NetworkRegistration']['Strength'].value, True])
-                                    elif self.ofono_interface_props['org.ofono.NetworkRegistration']['Status'].value == 'searching':
-                                        self.props['State'] = Variant('i', 7) # modem is searching MM_MODEM_STATE_SEARCHING
-                                    else:
-                                        self.props['State'] = Variant('i', 6) # modem is enabled MM_MODEM_STATE_ENABLED
+                                    props['State'] = Variant('i', MODEM_STATES.get(self.ofono_interface_props['org.ofono.NetworkRegistration']['Status'].value, MODEM_STATE_ENABLED))
                                 else:
-                                    self.props['State'] = Variant('i', 6) # modem is enabled MM_MODEM_STATE_ENABLED
+                                    props['State'] = Variant('i', 6) # modem is enabled MM_MODEM_STATE_ENABLED
                             else:
-                                self.props['State'] = Variant('i', 6) # modem is enabled MM_MODEM_STATE_ENABLED
+                                props['State'] = Variant('i', 6) # modem is enabled MM_MODEM_STATE_ENABLED
                         else:
-                            self.props['State'] = Variant('i', 3) # modem is disabled MM_MODEM_STATE_DISABLED
-
-                        self.props['UnlockRequired'] = Variant('u', 1) # modem is unlocked MM_MODEM_LOCK_NONE
+                            props['State'] = Variant('i', 3) # modem is disabled MM_MODEM_STATE_DISABLED
                     else:
-                        self.props['UnlockRequired'] = Variant('u', 2) # modem needs a pin MM_MODEM_LOCK_SIM_PIN
-                        self.props['State'] = Variant('i', 2)
+                        props['UnlockRequired'] = Variant('u', 2) # modem needs a pin MM_MODEM_LOCK_SIM_PIN
+                        props['State'] = Variant('i', 2)
 
-                    self.props['Sim'] = self.sim
-                    self.props['StateFailedReason'] = Variant('i', 0) # no failure MM_MODEM_STATE_FAILED_REASON_NONE
+                    props['Sim'] = self.sim
+                    props['StateFailedReason'] = Variant('u', 0) # no failure MM_MODEM_STATE_FAILED_REASON_NONE
                 else:
-                    self.props['Sim'] = Variant('o', '/')
-                    self.props['State'] = Variant('i', -1) # state unknown
-                    self.props['StateFailedReason'] = Variant('i', 2) # sim missing MM_MODEM_STATE_FAILED_REASON_SIM_MISSING
+                    props['Sim'] = Variant('o', '/')
+                    props['State'] = Variant('i', -1) # state unknown
+                    props['StateFailedReason'] = Variant('u', 2) # sim missing MM_MODEM_STATE_FAILED_REASON_SIM_MISSING
             else:
-                self.props['State'] = Variant('i', -1) # state unknown
-                self.props['StateFailedReason'] = Variant('i', 2) # sim missing MM_MODEM_STATE_FAILED_REASON_SIM_MISSING
+                props['State'] = Variant('i', -1) # state unknown
+                props['StateFailedReason'] = Variant('u', 2) # sim missing MM_MODEM_STATE_FAILED_REASON_SIM_MISSING
 
-            self.props['PowerState'] = Variant('i', 3) # power is on MM_MODEM_POWER_STATE_ON
+            props['PowerState'] = Variant('u', 3) # power is on MM_MODEM_POWER_STATE_ON
         else:
-            self.props['State'] = Variant('i', 3) # modem is disabled MM_MODEM_STATE_DISABLED
-            self.props['PowerState'] = Variant('i', 1) # power is off MM_MODEM_POWER_STATE_OFF
-
-        if 'org.ofono.SimManager' in self.ofono_interface_props:
-            self.props['OwnNumbers'] = Variant('as', self.ofono_interface_props['org.ofono.SimManager']['SubscriberNumbers'].value if 'SubscriberNumbers' in self.ofono_interface_props['org.ofono.SimManager'] else [])
-
-            if 'Retries' in self.ofono_interface_props['org.ofono.SimManager']:
-                if 'pin' in self.ofono_interface_props['org.ofono.SimManager']['Retries'].value:
-                    pin = self.ofono_interface_props['org.ofono.SimManager']['Retries'].value['pin']
-                else:
-                    pin = -1
-
-                if 'pin2' in self.ofono_interface_props['org.ofono.SimManager']['Retries'].value:
-                    pin2 = self.ofono_interface_props['org.ofono.SimManager']['Retries'].value['pin2']
-                else:
-                    pin2 = -1
+            props['State'] = Variant('i', 3) # modem is disabled MM_MODEM_STATE_DISABLED
+            props['PowerState'] = Variant('u', 1) # power is off MM_MODEM_POWER_STATE_OFF
 
-                if 'puk' in self.ofono_interface_props['org.ofono.SimManager']['Retries'].value:
-                    puk = self.ofono_interface_props['org.ofono.SimManager']['Retries'].value['puk']
-                else:
-                    puk = -1
+        return props
 
-                if 'puk2' in self.ofono_interface_props['org.ofono.SimManager']['Retries'].value:
-                    puk2 = self.ofono_interface_props['org.ofono.SimManager']['Retries'].value['puk2']
-                else:
-                    puk2 = -1
-
-                if 'service' in self.ofono_interface_props['org.ofono.SimManager']['Retries'].value:
-                    service = self.ofono_interface_props['org.ofono.SimManager']['Retries'].value['service']
-                else:
-                    service = -1
+    def update_signal_quality(self):
+        if self.props['State'].value != 8:
+            return {'SignalQuality': Variant('(ub)', [0, False])}
 
-                if 'servicepuk' in self.ofono_interface_props['org.ofono.SimManager']['Retries'].value:
-                    servicepuk = self.ofono_interface_props['org.ofono.SimManager']['Retries'].value['servicepuk']
-                else:
-                    servicepuk = -1
+        if 'Strength' in self.ofono_interface_props.get('org.ofono.NetworkRegistration', {}):
+            return {'SignalQuality': Variant('(ub)', [self.ofono_interface_props['org.ofono.NetworkRegistration']['Strength'].value, True])}
 
-                if 'network' in self.ofono_interface_props['org.ofono.SimManager']['Retries'].value:
-                    network = self.ofono_interface_props['org.ofono.SimManager']['Retries'].value['network']
-                else:
-                    network = -1
+        return {}
 
-                if 'networkpuk' in self.ofono_interface_props['org.ofono.SimManager']['Retries'].value:
-                    networkpuk = self.ofono_interface_props['org.ofono.SimManager']['Retries'].value['networkpuk']
-                else:
-                    networkpuk = -1
+    def update_access_technologies(self):
+        if 'org.ofono.NetworkRegistration' in self.ofono_interface_props and self.props['State'].value == 8:
+            if "Technology" in self.ofono_interface_props['org.ofono.NetworkRegistration']:
+                current_tech = 0
+                ofono_tech = self.ofono_interface_props['org.ofono.NetworkRegistration']["Technology"].value
+                if ofono_tech in ACCESS_TECHNOLOGIES:
+                    current_tech, self.mm_cell_type = ACCESS_TECHNOLOGIES[ofono_tech]
 
-                if 'corp' in self.ofono_interface_props['org.ofono.SimManager']['Retries'].value:
-                    corp = self.ofono_interface_props['org.ofono.SimManager']['Retries'].value['corp']
-                else:
-                    corp = -1
+                return {'AccessTechnologies': Variant('u', current_tech)}
 
-                if 'corppuk' in self.ofono_interface_props['org.ofono.SimManager']['Retries'].value:
-                    corppuk = self.ofono_interface_props['org.ofono.SimManager']['Retries'].value['corppuk']
-                else:
-                    corppuk = -1
+        return {'AccessTechnologies': Variant('u', 0)} # network is unknown MM_MODEM_ACCESS_TECHNOLOGY_UNKNOWN
 
-                if 'netsub' in self.ofono_interface_props['org.ofono.SimManager']['Retries'].value:
-                    netsub = self.ofono_interface_props['org.ofono.SimManager']['Retries'].value['netsub']
-                else:
-                    netsub = -1
+    def update_own_numbers(self):
+        if 'org.ofono.SimManager' in self.ofono_interface_props and 'SubscriberNumbers' in self.ofono_interface_props['org.ofono.SimManager']:
+            return {'OwnNumbers': Variant('as', self.ofono_interface_props['org.ofono.SimManager']['SubscriberNumbers'].value)}
 
-                if 'netsubpuk' in self.ofono_interface_props['org.ofono.SimManager']['Retries'].value:
-                    netsubpuk = self.ofono_interface_props['org.ofono.SimManager']['Retries'].value['netsubpuk']
-                else:
-                    netsubpuk = -1
-
-                unlock_retries = {}
-
-                if pin != -1:
-                    unlock_retries[2] = pin # MM_MODEM_LOCK_SIM_PIN
-                if pin2 != -1:
-                    unlock_retries[3] = pin2 # MM_MODEM_LOCK_SIM_PIN2
-                if puk != -1:
-                    unlock_retries[4] = puk # MM_MODEM_LOCK_SIM_PUK
-                if puk2 != -1:
-                    unlock_retries[5] = puk2 # MM_MODEM_LOCK_SIM_PUK2
-                if service != -1:
-                    unlock_retries[6] = service # MM_MODEM_LOCK_PH_SP_PIN
-                if servicepuk != -1:
-                    unlock_retries[7] = servicepuk # MM_MODEM_LOCK_PH_SP_PUK
-                if network != -1:
-                    unlock_retries[8] = network # MM_MODEM_LOCK_PH_NET_PIN
-                if networkpuk != -1:
-                    unlock_retries[9] = networkpuk # MM_MODEM_LOCK_PH_NET_PUK
-                if corp != -1:
-                    unlock_retries[11] = corp # MM_MODEM_LOCK_PH_CORP_PIN
-                if corppuk != -1:
-                    unlock_retries[12] = corppuk # MM_MODEM_LOCK_PH_CORP_PUK
-                if netsub != -1:
-                    unlock_retries[15] = netsub # MM_MODEM_LOCK_PH_NETSUB_PIN
-                if netsubpuk != -1:
-                    unlock_retries[16] = netsubpuk # MM_MODEM_LOCK_PH_NETSUB_PUK
-            else:
-                unlock_retries = {}
+        return {'OwnNumbers': Variant('as', [])}
 
-            self.props['UnlockRetries'] = Variant('a{uu}', unlock_retries)
-        else:
-            self.props['OwnNumbers'] = Variant('as', [])
-            self.props['UnlockRetries'] = Variant('a{uu}', {})
+    def update_unlock_retries(self):
+        unlock_retries = {}
+        if 'org.ofono.SimManager' in self.ofono_interface_props and 'Retries' in self.ofono_interface_props['org.ofono.SimManager']:
+            retries = self.ofono_interface_props['org.ofono.SimManager']['Retries'].value
+            for key in retries:
+                if key in UNLOCK_RETRIES:
+                    unlock_retries[UNLOCK_RETRIES[key]] = retries[key]
 
-        if 'org.ofono.NetworkRegistration' in self.ofono_interface_props and self.props['State'].value == 8:
-            if "Technology" in self.ofono_interface_props['org.ofono.NetworkRegistration']:
-                current_tech = 0
-                if self.ofono_interface_props['org.ofono.NetworkRegistration']["Technology"].value == "nr":
-                    current_tech |= 1 << 15 # network is 5g MM_MODEM_ACCESS_TECHNOLOGY_5GNR
-                    self.mm_cell_type = 6 # cell type is 5g MM_CELL_TYPE_5GNR
-                elif self.ofono_interface_props['org.ofono.NetworkRegistration']["Technology"].value == "lte":
-                    current_tech |= 1 << 14 # network is lte MM_MODEM_ACCESS_TECHNOLOGY_LTE
-                    self.mm_cell_type = 5 # cell type is lte MM_CELL_TYPE_LTE
-                elif self.ofono_interface_props['org.ofono.NetworkRegistration']["Technology"].value == "hspa":
-                    current_tech |= 1 << 8 # network is hspa MM_MODEM_ACCESS_TECHNOLOGY_HSPA
-                    self.mm_cell_type = 3 # cell type is umts MM_CELL_TYPE_UMTS
-                elif self.ofono_interface_props['org.ofono.NetworkRegistration']["Technology"].value == "hsupa":
-                    current_tech |= 1 << 7 # network is hsupa MM_MODEM_ACCESS_TECHNOLOGY_HSUPA
-                    self.mm_cell_type = 3 # cell type is umts MM_CELL_TYPE_UMTS
-                elif self.ofono_interface_props['org.ofono.NetworkRegistration']["Technology"].value == "hsdpa":
-                    current_tech |= 1 << 6 # network is hsdpa MM_MODEM_ACCESS_TECHNOLOGY_HSDPA
-                    self.mm_cell_type = 3 # cell type is umts MM_CELL_TYPE_UMTS
-                elif self.ofono_interface_props['org.ofono.NetworkRegistration']["Technology"].value == "umts":
-                    current_tech |= 1 << 5 # network is umts MM_MODEM_ACCESS_TECHNOLOGY_UMTS
-                    self.mm_cell_type = 3 # cell type is umts MM_CELL_TYPE_UMTS
-                elif self.ofono_interface_props['org.ofono.NetworkRegistration']["Technology"].value == "edge":
-                    current_tech |= 1 << 4 # network is gsm MM_MODEM_ACCESS_TECHNOLOGY_GSM
-                    self.mm_cell_type = 2 # cell type is gsm MM_CELL_TYPE_GSM
-                elif self.ofono_interface_props['org.ofono.NetworkRegistration']["Technology"].value == "gprs":
-                    current_tech |= 1 << 3 # network is gsm MM_MODEM_ACCESS_TECHNOLOGY_GSM
-                    self.mm_cell_type = 2 # cell type is gsm MM_CELL_TYPE_GSM
-                elif self.ofono_interface_props['org.ofono.NetworkRegistration']["Technology"].value == "gsm":
-                    current_tech |= 1 << 1 # network is gsm MM_MODEM_ACCESS_TECHNOLOGY_GSM
-                    self.mm_cell_type = 2 # cell type is gsm MM_CELL_TYPE_GSM
-
-                self.props['AccessTechnologies'] = Variant('u', current_tech)
-            else:
-                self.props['AccessTechnologies'] = Variant('u', 0) # network is unknown MM_MODEM_ACCESS_TECHNOLOGY_UNKNOWN
-        else:
-            self.props['AccessTechnologies'] = Variant('u', 0)
-            self.props['SignalQuality'] = Variant('(ub)', [0, False])
+        return {'UnlockRetries': Variant('a{uu}', unlock_retries)}
 
+    def update_modes(self):
+        props = {}
         caps = 0
         modes = 0
         pref = 0
         if 'org.ofono.RadioSettings' in self.ofono_interface_props:
             if 'AvailableTechnologies' in self.ofono_interface_props['org.ofono.RadioSettings']:
                 ofono_techs = self.ofono_interface_props['org.ofono.RadioSettings']['AvailableTechnologies'].value
-                if 'gsm' in ofono_techs:
-                    caps |= 4
-                    modes |= 2
-                if 'umts' in ofono_techs:
-                    caps |= 4
-                    modes |= 4
-                if 'lte' in ofono_techs:
-                    caps |= 8
-                    modes |= 8
-                if 'nr' in ofono_techs:
-                    caps |= 16
-                    modes |= 16
+                for ofono_tech in ofono_techs:
+                    if ofono_tech in TECHNOLOGY_MODES:
+                        caps |= TECHNOLOGY_MODES[ofono_tech][0]
+                        modes |= TECHNOLOGY_MODES[ofono_tech][1]
 
             if 'TechnologyPreference' in self.ofono_interface_props['org.ofono.RadioSettings']:
                 ofono_pref =  self.ofono_interface_props['org.ofono.RadioSettings']['TechnologyPreference'].value
-                if ofono_pref == 'nr':
-                    pref = 16 # current mode nr MM_MODEM_MODE_5G
-                if ofono_pref == 'lte':
-                    pref = 8 # current mode lte MM_MODEM_MODE_4G
-                if ofono_pref == 'umts':
-                    pref = 4 # current mode umts MM_MODEM_MODE_3G
-                if ofono_pref == 'gsm':
-                    pref = 2 # current mode gsm MM_MODEM_MODE_2G
-
-        self.props['CurrentCapabilities'] = Variant('u', caps)
-        self.props['SupportedCapabilities'] = Variant('au', [caps])
+                pref = TECHNOLOGY_PREFERENCES.get(ofono_pref, 0)
+
+        props['CurrentCapabilities'] = Variant('u', caps)
+        props['SupportedCapabilities'] = Variant('au', [caps])
 
         if caps == 0:
-            self.props['CurrentCapabilities'] = Variant('u', 4) # lte MM_MODEM_CAPABILITY_LTE
-            self.props['SupportedCapabilities'] = Variant('au', [4]) # lte MM_MODEM_CAPABILITY_LTE
-
-        supported_modes = []
-        if modes == 30:
-            supported_modes.append([30, 16])
-            supported_modes.append([14, 8])
-            supported_modes.append([6, 4])
-            supported_modes.append([2, 0])
-        if modes == 28:
-            supported_modes.append([28, 0])
-        if modes == 26:
-            supported_modes.append([26, 0])
-        if modes == 24:
-            supported_modes.append([24, 0])
-        if modes == 22:
-            supported_modes.append([22, 0])
-        if modes == 20:
-            supported_modes.append([20, 0])
-        if modes == 18:
-            supported_modes.append([18, 0])
-        if modes == 16:
-            supported_modes.append([16, 0])
-        if modes == 14:
-            supported_modes.append([14, 8])
-            supported_modes.append([6, 4])
-            supported_modes.append([2, 0])
-        if modes == 12:
-            supported_modes.append([12, 8])
-            supported_modes.append([4, 0])
-        if modes == 10:
-            supported_modes.append([10, 8])
-            supported_modes.append([2, 0])
-        if modes == 8:
-            supported_modes.append([8, 0])
-        if modes == 6:
-            supported_modes.append([6, 4])
-            supported_modes.append([2, 0])
-        if modes == 4:
-            supported_modes.append([4, 0])
-        if modes == 2:
-            supported_modes.append([2, 0])
-
-        self.props['SupportedModes'] = Variant('a(uu)', supported_modes)
+            props['CurrentCapabilities'] = Variant('u', 4) # lte MM_MODEM_CAPABILITY_LTE
+            props['SupportedCapabilities'] = Variant('au', [4]) # lte MM_MODEM_CAPABILITY_LTE
+
+        supported_modes = SUPPORTED_MODES.get(modes, [])
+
+        props['SupportedModes'] = Variant('a(uu)', supported_modes)
         for mode in supported_modes:
             if mode[1] == pref:
-                self.props['CurrentModes'] = Variant('(uu)', [mode[0], pref])
+                props['CurrentModes'] = Variant('(uu)', [mode[0], pref])
             if mode[1] == 0 and mode[0] == pref:
-                self.props['CurrentModes'] = Variant('(uu)', [mode[0], 0]) # current mode none MM_MODEM_MODE_NONE
+                props['CurrentModes'] = Variant('(uu)', [mode[0], 0]) # current mode none MM_MODEM_MODE_NONE
 
         if supported_modes == []:
-            self.props['SupportedModes'] = Variant('a(uu)', [[0, 0]]) # allowed mode none, preferred mode none MM_MODEM_MODE_NONE
-            self.props['CurrentModes'] = Variant('(uu)', [0, 0]) # allowed mode none, preferred mode none MM_MODEM_MODE_NONE
-
-        self.props['EquipmentIdentifier'] = Variant('s', self.ofono_props['Serial'].value if 'Serial' in self.ofono_props else '')
-        self.props['HardwareRevision'] = Variant('s', self.ofono_props['Revision'].value if 'Revision' in self.ofono_props else '')
-        self.props['Revision'] = Variant('s', self.ofono_props['SoftwareVersionNumber'].value if 'SoftwareVersionNumber' in self.ofono_props else '')
-        self.props['Manufacturer'] = Variant('s', self.ofono_props['Manufacturer'].value if 'Manufacturer' in self.ofono_props else 'ofono')
-        self.props['Model'] = Variant('s', self.ofono_props['Model'].value if 'Model' in self.ofono_props else 'binder')
-
-        if old_state != self.props['State'].value:
-            self.StateChanged(old_state, self.props['State'].value, 1)
-
-        changed_props = {}
-        for prop in self.props:
-            if self.props[prop].value != old_props[prop].value:
-                changed_props.update({ prop: self.props[prop].value })
-
-        self.emit_properties_changed(changed_props)
+            props['SupportedModes'] = Variant('a(uu)', [[0, 0]]) # allowed mode none, preferred mode none MM_MODEM_MODE_NONE
+            props['CurrentModes'] = Variant('(uu)', [0, 0]) # allowed mode none, preferred mode none MM_MODEM_MODE_NONE
+
+        return props
+
+    def update_identity(self):
+        return {
+            'EquipmentIdentifier': Variant('s', self.ofono_props['Serial'].value if 'Serial' in self.ofono_props else ''),
+            'HardwareRevision': Variant('s', self.ofono_props['Revision'].value if 'Revision' in self.ofono_props else ''),
+            'Revision': Variant('s', self.ofono_props['SoftwareVersionNumber'].value if 'SoftwareVersionNumber' in self.ofono_props else ''),
+            'Manufacturer': Variant('s', self.ofono_props['Manufacturer'].value if 'Manufacturer' in self.ofono_props else 'ofono'),
+            'Model': Variant('s', self.ofono_props['Model'].value if 'Model' in self.ofono_props else 'binder'),
+        }
 
     @method()
     async def Enable(self, enable: 'b'):
@@ -642,12 +652,9 @@ class MMModemInterface(ServiceInterface):
             pass
 
     async def doCreateBearer(self, properties):
-        global bearer_i
-
         if 'org.ofono.ConnectionManager' not in self.ofono_interfaces:
             return
 
-        # print(f"docreatebearer {bearer_i}" )
         mm_bearer_interface = MMBearerInterface(self.index, self.bus, self.ofono_client, self.modem_name, self.ofono_modem, self.ofono_props, self.ofono_interfaces, self.ofono_interface_props, self)
         mm_bearer_interface.props.update({
             "Properties": Variant('a{sv}', properties)
@@ -657,33 +664,19 @@ class MMModemInterface(ServiceInterface):
             # users would usually have to do
             # set-context-property 0 AccessPointName example.apn && activate-context 1
             # to activate the correct context for ofono2mm to use, lets do it on bearer creation to not need ofono scripts
-            contexts = await self.ofono_interfaces['org.ofono.ConnectionManager'].call_get_contexts()
-            self.context_names = []
-            ctx_idx = 0
-            chosen_apn = None
-            chosen_ctx_path = None
-            for ctx in contexts:
-                name = ctx[1].get('Type', Variant('s', '')).value
-                access_point_name = ctx[1].get('AccessPointName', Variant('s', '')).value
-                if name.lower() == "internet":
-                    ctx_idx += 1
-                    if access_point_name:
-                        self.context_names.append(access_point_name)
-                        chosen_apn = access_point_name
-                        chosen_ctx_path = ctx[0]
-
-                        # print(chosen_ctx_path)
-
-                if chosen_ctx_path:
-                    # print("set apn")
-                    chosen_ctx_interface = self.ofono_client["ofono_context"][chosen_ctx_path]['org.ofono.ConnectionContext']
-                    await chosen_ctx_interface.call_set_property("Active", Variant('b', False))
-                    await chosen_ctx_interface.call_set_property("AccessPointName", Variant('s', chosen_apn))
-                    await chosen_ctx_interface.call_set_property("Protocol", Variant('s', 'ip'))
-                    await chosen_ctx_interface.call_set_property("Active", Variant('b', True))
+            chosen_ctx_path = self.get_internet_context()
+            if chosen_ctx_path:
+                # print("set apn")
+                chosen_apn = self.ofono_contexts[chosen_ctx_path]['AccessPointName'].value
+                chosen_ctx_interface = self.ofono_client["ofono_context"][chosen_ctx_path]['org.ofono.ConnectionContext']
+                await chosen_ctx_interface.call_set_property("Active", Variant('b', False))
+                await chosen_ctx_interface.call_set_property("AccessPointName", Variant('s', chosen_apn))
+                await chosen_ctx_interface.call_set_property("Protocol", Variant('s', 'ip'))
+                await chosen_ctx_interface.call_set_property("Active", Variant('b', True))
 
         ofono_ctx = await self.ofono_interfaces['org.ofono.ConnectionManager'].call_add_context("internet")
         ofono_ctx_interface = self.ofono_client["ofono_context"][ofono_ctx]['org.ofono.ConnectionContext']
+        mm_bearer_interface.ofono_ctx = ofono_ctx
         if 'apn' in properties:
             await ofono_ctx_interface.call_set_property("AccessPointName", properties['apn'])
 
@@ -691,23 +684,24 @@ class MMModemInterface(ServiceInterface):
                                                         properties['password'].value if 'password' in properties else '')
 
         await ofono_ctx_interface.call_set_property("Protocol", Variant('s', 'ip'))
-        mm_bearer_interface.ofono_ctx = ofono_ctx
-        self.bus.export(f'/org/freedesktop/ModemManager/Bearer/{bearer_i}', mm_bearer_interface)
-        self.props['Bearers'].value.append(f'/org/freedesktop/ModemManager/Bearer/{bearer_i}')
-        self.bearers[f'/org/freedesktop/ModemManager/Bearer/{bearer_i}'] = mm_bearer_interface
+
+        # ContextAdded for the new context usually beats the replies above and exported its bearer already
+        path = self.context_bearer(ofono_ctx)
+        if path is None:
+            path = self.export_bearer(mm_bearer_interface)
+        else:
+            self.bearers[path].props['Properties'] = Variant('a{sv}', properties)
+
         self.emit_properties_changed({'Bearers': self.props['Bearers'].value})
-        bearer_i += 1
 
-        return f'/org/freedesktop/ModemManager/Bearer/{bearer_i}'
+        return path
 
     @method()
     async def DeleteBearer(self, path: 'o'):
-        if path in self.props['Bearers'].value:
-            self.props['Bearers'].value.remove(path)
-            await self.ofono_interfaces['org.ofono.ConnectionManager'].call_remove_context(self.bearers[path].ofono_ctx)
-            self.bearers.pop(path)
-            self.bus.unexport(path)
-            self.emit_properties_changed({'Bearers': self.props['Bearers'].value})
+        if path in self.bearers:
+            ofono_ctx = self.bearers[path].ofono_ctx
+            self.remove_bearer(path)
+            await self.ofono_interfaces['org.ofono.ConnectionManager'].call_remove_context(ofono_ctx)
 
     @method()
     async def Reset(self):
@@ -765,21 +759,16 @@ class MMModemInterface(ServiceInterface):
     @method()
     async def SetCurrentModes(self, modes: '(uu)'):
         if modes in self.props['SupportedModes'].value:
-            if modes[1] == 16:
-                await self.ofono_interfaces['org.ofono.RadioSettings'].call_set_property('TechnologyPreference', Variant('s', 'nr'))
-            if modes[1] == 8:
-                await self.ofono_interfaces['org.ofono.RadioSettings'].call_set_property('TechnologyPreference', Variant('s', 'lte'))
-            if modes[1] == 4:
-                await self.ofono_interfaces['org.ofono.RadioSettings'].call_set_property('TechnologyPreference', Variant('s', 'umts'))
+            ofono_pref = PREFERRED_TECHNOLOGIES.get(modes[1])
             if modes[1] == 0:
-                if modes[0] | 2:
-                    await self.ofono_interfaces['org.ofono.RadioSettings'].call_set_property('TechnologyPreference', Variant('s', 'gsm'))
-                elif modes[0] | 4:
-                    await self.ofono_interfaces['org.ofono.RadioSettings'].call_set_property('TechnologyPreference', Variant('s', 'umts'))
-                elif modes[0] | 8:
-                    await self.ofono_interfaces['org.ofono.RadioSettings'].call_set_property('TechnologyPreference', Variant('s', 'lte'))
-                elif modes[0] | 16:
-                    await self.ofono_interfaces['org.ofono.RadioSettings'].call_set_property('TechnologyPreference', Variant('s', 'nr'))
+                # no preference, ofono's TechnologyPreference is the highest technology the modem may use
+                for mode in sorted(PREFERRED_TECHNOLOGIES, reverse=True):
+                    if modes[0] & mode:
+                        ofono_pref = PREFERRED_TECHNOLOGIES[mode]
+                        break
+
+            if ofono_pref is not None:
+                await self.ofono_interfaces['org.ofono.RadioSettings'].call_set_property('TechnologyPreference', Variant('s', ofono_pref))
 
         self.set_props()
 
@@ -945,7 +934,6 @@ class MMModemInterface(ServiceInterface):
         return self.props['SupportedIpFamilies'].value
 
     def ofono_changed(self, name, varval):
-        self.ofono_props[name] = varval
         if name == "Interfaces":
             for iface in varval.value:
                 if not (iface in self.ofono_interfaces):
@@ -954,20 +942,19 @@ class MMModemInterface(ServiceInterface):
                 if not (iface in varval.value):
                     self.loop.create_task(self.remove_ofono_interface(iface))
 
-        self.set_props()
-        if self.mm_modem3gpp_interface:
-            self.mm_modem3gpp_interface.ofono_changed(name, varval)
-        if self.mm_sim_interface:
-            self.mm_sim_interface.ofono_changed(name, varval)
+        self.ofono_state.update('org.ofono.Modem', name, varval)
 
     def ofono_interface_changed(self, iface):
         def ch(name, varval):
-            if iface in self.ofono_interface_props:
-                self.ofono_interface_props[iface][name] = varval
-                self.set_props()
-                if self.mm_modem3gpp_interface:
-                    self.mm_modem3gpp_interface.ofono_interface_changed(iface)(name, varval)
-                if self.mm_sim_interface:
-                    self.mm_sim_interface.ofono_interface_changed(iface)(name, varval)
+            self.ofono_state.update(iface, name, varval)
 
         return ch
+
+    def ofono_registration_changed(self, iface, name, varval):
+        # coming back into coverage is the best moment to try connecting again
+        if varval is not None and varval.value in ("registered", "roaming"):
+            self.bearer_retry_policy.resume()
+
+    def ofono_state_changed(self, iface, name, varval):
+        # a whole interface coming or going can change any property
+        self.set_props(None if name is None else (iface, name))
@@ -3,7 +3,17 @@ from dbus_next.service import (ServiceInterface,
 from dbus_next.constants import PropertyAccess
 from dbus_next import Variant, DBusError
 
-class MMModem3gppInterface(ServiceInterface):
+from ofono2mm.mappings import ACCESS_TECHNOLOGIES, OPERATOR_STATUSES, REGISTRATION_STATES, REGISTRATION_STATE_UNKNOWN
+from ofono2mm.utils import CoalescedServiceInterface
+
+class MMModem3gppInterface(CoalescedServiceInterface):
+    ofono_inputs = [
+        ('org.ofono.Modem', 'Serial'),
+        ('org.ofono.NetworkRegistration', 'Name'),
+        ('org.ofono.NetworkRegistration', 'MobileNetworkCode'),
+        ('org.ofono.NetworkRegistration', 'Status'),
+    ]
+
     def __init__(self, index, bus, ofono_client, modem_name, ofono_modem, ofono_props, ofono_interfaces, ofono_interface_props):
         super().__init__('org.freedesktop.ModemManager1.Modem.Modem3gpp')
         self.index = index
@@ -39,18 +49,7 @@ class MMModem3gppInterface(ServiceInterface):
             self.props['OperatorName'] = Variant('s', self.ofono_interface_props['org.ofono.NetworkRegistration']['Name'].value if "Name" in self.ofono_interface_props['org.ofono.NetworkRegistration'] else '')
             self.props['OperatorCode'] = Variant('s', self.ofono_interface_props['org.ofono.NetworkRegistration']['MobileNetworkCode'].value if "MobileNetworkCode" in self.ofono_interface_props['org.ofono.NetworkRegistration'] else '')
             if 'Status' in self.ofono_interface_props['org.ofono.NetworkRegistration']:
-                if self.ofono_interface_props['org.ofono.NetworkRegistration']['Status'].value == "unregisered":
-                    self.props['RegistrationState'] = Variant('u', 0) # idle MM_MODEM_3GPP_REGISTRATION_STATE_IDLE
-                elif self.ofono_interface_props['org.ofono.NetworkRegistration']['Status'].value == "registered":
-                    self.props['RegistrationState'] = Variant('u', 1) # home MM_MODEM_3GPP_REGISTRATION_STATE_HOME
-                elif self.ofono_interface_props['org.ofono.NetworkRegistration']['Status'].value == "searching":
-                    self.props['RegistrationState'] = Variant('u', 2) # searching MM_MODEM_3GPP_REGISTRATION_STATE_SEARCHING
-                elif self.ofono_interface_props['org.ofono.NetworkRegistration']['Status'].value == "denied":
-                    self.props['RegistrationState'] = Variant('u', 3) # denied MM_MODEM_3GPP_REGISTRATION_STATE_DENIED
-                elif self.ofono_interface_props['org.ofono.NetworkRegistration']['Status'].value == "unknown":
-                    self.props['RegistrationState'] = Variant('u', 4) # unknown MM_MODEM_3GPP_REGISTRATION_STATE_UNKNOWN
-                elif self.ofono_interface_props['org.ofono.NetworkRegistration']['Status'].value == "roaming":
-                    self.props['RegistrationState'] = Variant('u', 5) # MM_MODEM_3GPP_REGISTRATION_STATE_ROAMING
+                self.props['RegistrationState'] = Variant('u', REGISTRATION_STATES.get(self.ofono_interface_props['org.ofono.NetworkRegistration']['Status'].value, REGISTRATION_STATE_UNKNOWN))
             else:
                 self.props['RegistrationState'] = Variant('u', 4) # unknown MM_MODEM_3GPP_REGISTRATION_STATE_UNKNOWN
         else:
@@ -90,14 +89,8 @@ class MMModem3gppInterface(ServiceInterface):
         ofono_operators = await self.ofono_interfaces['org.ofono.NetworkRegistration'].call_scan()
         for ofono_operator in ofono_operators:
             mm_operator = {}
-            if ofono_operator[1]['Status'].value == "unknown":
-                mm_operator.update({'status': Variant('u', 0)})
-            if ofono_operator[1]['Status'].value == "available":
-                mm_operator.update({'status': Variant('u', 1)})
-            if ofono_operator[1]['Status'].value == "current":
-                mm_operator.update({'status': Variant('u', 2)})
-            if ofono_operator[1]['Status'].value == "forbidden":
-                mm_operator.update({'status': Variant('u', 3)})
+            if ofono_operator[1]['Status'].value in OPERATOR_STATUSES:
+                mm_operator.update({'status': Variant('u', OPERATOR_STATUSES[ofono_operator[1]['Status'].value])})
 
             mm_operator.update({'operator-long': ofono_operator[1]['Name']})
             mm_operator.update({'operator-short': ofono_operator[1]['Name']})
@@ -105,14 +98,8 @@ class MMModem3gppInterface(ServiceInterface):
 
             current_tech = 0
             for tech in ofono_operator[1]['Technologies'].value:
-                if tech == "nr":
-                    current_tech |= 1 << 15
-                if tech == "lte":
-                    current_tech |= 1 << 14
-                elif tech == "umts":
-                    current_tech |= 1 << 5
-                elif tech == "gsm":
-                    current_tech |= 1 << 1
+                if tech in ACCESS_TECHNOLOGIES:
+                    current_tech |= ACCESS_TECHNOLOGIES[tech][0]
 
             mm_operator.update({'access-technology': Variant('u', current_tech)})
             operators.append(mm_operator)
@@ -191,14 +178,5 @@ class MMModem3gppInterface(ServiceInterface):
     def Nr5gRegistrationSettings(self) -> 'a{sv}':
         return self.props['Nr5gRegistrationSettings'].value
 
-    def ofono_changed(self, name, varval):
-        self.ofono_props[name] = varval
+    def ofono_state_changed(self, iface, name, varval):
         self.set_props()
-
-    def ofono_interface_changed(self, iface):
-        def ch(name, varval):
-            if iface in self.ofono_interface_props:
-                self.ofono_interface_props[iface][name] = varval
-            self.set_props()
-
-        return ch
@@ -2,9 +2,12 @@ from dbus_next.service import (ServiceInterface,
                                method, dbus_property, signal)
 from dbus_next.constants import PropertyAccess
 from dbus_next import Variant, DBusError
+
+from ofono2mm.utils import CoalescedServiceInterface
+
 import asyncio
 
-class MMModem3gppProfileManagerInterface(ServiceInterface):
+class MMModem3gppProfileManagerInterface(CoalescedServiceInterface):
     def __init__(self, index, bus, ofono_client, modem_name, ofono_modem, ofono_props, ofono_interfaces, ofono_interface_props):
         super().__init__('org.freedesktop.ModemManager1.Modem.Modem3gpp.ProfileManager')
         self.index = index
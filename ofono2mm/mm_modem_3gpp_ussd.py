@@ -2,7 +2,9 @@ from dbus_next.service import ServiceInterface, method, dbus_property, signal
 from dbus_next.constants import PropertyAccess
 from dbus_next import Variant
 
-class MMModem3gppUssdInterface(ServiceInterface):
+from ofono2mm.utils import CoalescedServiceInterface, SignalSubscriptions
+
+class MMModem3gppUssdInterface(CoalescedServiceInterface):
     def __init__(self, index, bus, ofono_client, modem_name, ofono_modem, ofono_props, ofono_interfaces, ofono_interface_props):
         super().__init__('org.freedesktop.ModemManager1.Modem.Modem3gpp.Ussd')
         self.index = index
@@ -14,6 +16,7 @@ class MMModem3gppUssdInterface(ServiceInterface):
         self.ofono_props = ofono_props
         self.ofono_interfaces = ofono_interfaces
         self.ofono_interface_props = ofono_interface_props
+        self.subscriptions = SignalSubscriptions()
         self.props = {
             'State': Variant('u', 0), # on runtime unknown MM_MODEM_3GPP_USSD_SESSION_STATE_UNKNOWN
             'NetworkNotification': Variant('s', ''),
@@ -40,6 +43,10 @@ class MMModem3gppUssdInterface(ServiceInterface):
     @dbus_property(access=PropertyAccess.READ)
     async def State(self) -> 'u':
         try:
+            # subscribe ahead of awaiting, the modem could be torn down before the reply arrives
+            self.subscriptions.on(self.ofono_interfaces['org.ofono.SupplementaryServices'], 'notification_received', self.save_notification_received)
+            self.subscriptions.on(self.ofono_interfaces['org.ofono.SupplementaryServices'], 'request_received', self.save_request_received)
+
             result = await self.ofono_interfaces['org.ofono.SupplementaryServices'].call_get_properties()
             result_str = result['State'].value
 
@@ -51,9 +58,6 @@ class MMModem3gppUssdInterface(ServiceInterface):
                 self.props['State'] = Variant('u', 3) # user response MM_MODEM_3GPP_USSD_SESSION_STATE_USER_RESPONSE
             else:
                 self.props['State'] = Variant('u', 0) # unknown MM_MODEM_3GPP_USSD_SESSION_STATE_UNKNOWN
-
-            self.ofono_interfaces['org.ofono.SupplementaryServices'].on_notification_received(self.save_notification_received)
-            self.ofono_interfaces['org.ofono.SupplementaryServices'].on_request_received(self.save_request_received)
         except Exception as e:
             self.props['State'] = Variant('u', 0) # unknown MM_MODEM_3GPP_USSD_SESSION_STATE_UNKNOWN
 
@@ -2,7 +2,9 @@ from dbus_next.service import (ServiceInterface, method, dbus_property, signal)
 from dbus_next.constants import PropertyAccess
 from dbus_next import Variant
 
-class MMModemFirmwareInterface(ServiceInterface):
+from ofono2mm.utils import CoalescedServiceInterface
+
+class MMModemFirmwareInterface(CoalescedServiceInterface):
     def __init__(self, mm_modem):
         super().__init__('org.freedesktop.ModemManager1.Modem.Firmware')
         self.mm_modem = mm_modem
@@ -22,9 +24,12 @@ class MMModemFirmwareInterface(ServiceInterface):
         old_props = self.props.copy()
         self.set_props()
 
+        changed_props = {}
         for prop in self.props:
             if self.props[prop].value != old_props[prop].value:
-                self.emit_properties_changed({prop: self.props[prop].value})
+                changed_props.update({ prop: self.props[prop].value })
+
+        self.emit_properties_changed(changed_props)
 
     @dbus_property(access=PropertyAccess.READ)
     def UpdateSettings(self) -> '(ua{sv})':
@@ -1,12 +1,26 @@
 from dbus_next.service import ServiceInterface, method, dbus_property, signal
 from dbus_next.constants import PropertyAccess
 from dbus_next import Variant
+
+from ofono2mm.utils import CoalescedServiceInterface
+
 from datetime import datetime
-import gi
-gi.require_version('Geoclue', '2.0')
-from gi.repository import Geoclue
+import time
+
+# loaded on first use, gobject introspection is slow to import and only the location interface needs it
+Geoclue = None
+
+def load_geoclue():
+    global Geoclue
+    if Geoclue is None:
+        import gi
+        gi.require_version('Geoclue', '2.0')
+        from gi.repository import Geoclue as geoclue
+        Geoclue = geoclue
 
-class MMModemLocationInterface(ServiceInterface):
+    return Geoclue
+
+class MMModemLocationInterface(CoalescedServiceInterface):
     def __init__(self, modem):
         super().__init__('org.freedesktop.ModemManager1.Modem.Location')
         self.modem = modem
@@ -31,20 +45,32 @@ class MMModemLocationInterface(ServiceInterface):
             'GpsRefreshRate': Variant('u', 30)
         }
 
-    @method()
-    def Setup(self, sources: 'u', signal_location: 'b') -> None:
-        self.props['Enabled'] = Variant('u', sources)
-        self.props['SignalsLocation'] = Variant('b', signal_location)
+        self.location_time = None
+        self.location_task = None
+        self.location_handle = None
 
-    @method()
-    async def GetLocation(self) -> 'a{uv}':
+    def read_location(self):
+        # runs in an executor thread, geoclue only has blocking calls without a glib main loop.
+        # no glib main loop runs for the client either, so it never sees LocationUpdated and
+        # a new one is needed for every fix
+        Geoclue = load_geoclue()
         geoclue = Geoclue.Simple.new_sync('ModemManager', Geoclue.AccuracyLevel.NEIGHBORHOOD, None)
         location = geoclue.get_location()
+        return location.get_property('latitude'), location.get_property('longitude'), location.get_property('altitude')
+
+    async def refresh_location(self):
+        # share one geoclue request between concurrent callers
+        if self.location_task is None:
+            self.location_task = self.modem.loop.run_in_executor(None, self.read_location)
+
+        try:
+            # geoclue has issues, it returns lat and long in place of each other
+            longitude, latitude, altitude = await self.location_task
+        except Exception as e:
+            return False
+        finally:
+            self.location_task = None
 
-        # geoclue has issues, it returns lat and long in place of each other
-        longitude = location.get_property('latitude')
-        latitude = location.get_property('longitude')
-        altitude = location.get_property('altitude')
         utc_time = datetime.utcnow().isoformat()
 
         self.location = {
@@ -55,6 +81,44 @@ class MMModemLocationInterface(ServiceInterface):
                 'altitude': Variant('d', altitude)
             })
         }
+        self.location_time = time.monotonic()
+        return True
+
+    def location_is_fresh(self):
+        return self.location_time is not None and time.monotonic() - self.location_time < self.props['GpsRefreshRate'].value
+
+    def schedule_location_update(self):
+        if self.location_handle is not None:
+            self.location_handle.cancel()
+            self.location_handle = None
+
+        # 2 is MM_MODEM_LOCATION_SOURCE_GPS_RAW
+        if self.props['SignalsLocation'].value and self.props['Enabled'].value & 2:
+            self.location_handle = self.modem.loop.call_later(max(self.props['GpsRefreshRate'].value, 1), self.update_location)
+
+    def teardown(self):
+        if self.location_handle is not None:
+            self.location_handle.cancel()
+            self.location_handle = None
+
+    def update_location(self):
+        self.modem.loop.create_task(self.push_location())
+        self.schedule_location_update()
+
+    async def push_location(self):
+        if await self.refresh_location():
+            self.emit_properties_changed({'Location': self.location})
+
+    @method()
+    def Setup(self, sources: 'u', signal_location: 'b') -> None:
+        self.props['Enabled'] = Variant('u', sources)
+        self.props['SignalsLocation'] = Variant('b', signal_location)
+        self.schedule_location_update()
+
+    @method()
+    async def GetLocation(self) -> 'a{uv}':
+        if not self.location_is_fresh():
+            await self.refresh_location()
 
         return self.location
 
@@ -69,6 +133,7 @@ class MMModemLocationInterface(ServiceInterface):
     @method()
     def SetGpsRefreshRate(self, rate: 'u') -> None:
         self.props['GpsRefreshRate'] = Variant('u', rate)
+        self.schedule_location_update()
 
     @dbus_property(access=PropertyAccess.READ)
     def Capabilities(self) -> 'u':
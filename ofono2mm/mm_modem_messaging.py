@@ -1,13 +1,18 @@
 from dbus_next.service import (ServiceInterface,
                                method, dbus_property, signal)
 from dbus_next.constants import PropertyAccess
-from dbus_next import Variant
+from dbus_next import Variant, MessageType, DBusError
 
-from ofono2mm.mm_sms import MMSmsInterface
+from collections import OrderedDict
+import asyncio
+import time
 
-message_i = 1
+from ofono2mm.mm_sms import MMSmsInterface, sms_props
+from ofono2mm.utils import CoalescedServiceInterface, RetryPolicy, SignalSubscriptions
+from ofono2mm.sms_store import sms_store
+from ofono2mm.metrics import metrics
 
-class MMModemMessagingInterface(ServiceInterface):
+class MMModemMessagingInterface(CoalescedServiceInterface):
     def __init__(self, index, bus, ofono_client, modem_name, ofono_modem, ofono_props, ofono_interfaces, ofono_interface_props):
         super().__init__('org.freedesktop.ModemManager1.Modem.Messaging')
         self.index = index
@@ -24,6 +29,15 @@ class MMModemMessagingInterface(ServiceInterface):
             'SupportedStorages': Variant('au', []),
             'DefaultStorage': Variant('u', 0) # hardcoded value unknown MM_SMS_STORAGE_UNKNOWN
         }
+        self.subscriptions = SignalSubscriptions()
+        self.messages = {} # object path: store id
+        self.messages_restored = False
+        self.exported_messages = OrderedDict() # object path: sms interface, least recently used first
+        self.max_exported_messages = 32
+        self.send_semaphore = asyncio.Semaphore(2)
+        self.send_retry_policy = RetryPolicy('sms_send', base_delay=2, max_delay=60, max_attempts=3, failure_threshold=0)
+        self.send_tasks = {} # object path: task handing the message to ofono
+        self.pending_sends = {} # ofono message path: (object path, queue time, property handler)
 
     def set_props(self):
         old_props = self.props
@@ -33,11 +47,118 @@ class MMModemMessagingInterface(ServiceInterface):
                 self.emit_properties_changed({prop: self.props[prop].value})
 
     async def init_messages(self):
+        if not self.messages_restored:
+            self.messages_restored = True
+            self.restore_messages()
+
         if 'org.ofono.MessageManager' in self.ofono_interfaces:
-            self.ofono_interfaces['org.ofono.MessageManager'].on_incoming_message(self.add_incoming_message)
+            self.subscriptions.on(self.ofono_interfaces['org.ofono.MessageManager'], 'incoming_message', self.add_incoming_message)
+            self.subscriptions.on(self.ofono_interfaces['org.ofono.MessageManager'], 'message_removed', self.ofono_message_removed)
+
+    def restore_messages(self):
+        # only the paths are loaded here, the sms objects are exported when a client first asks for them
+        for row in sms_store.list(self.modem_name):
+            self.messages[f'/org/freedesktop/ModemManager1/SMS/{row[0]}'] = row[0]
+
+        self.bus.add_message_handler(self.export_on_demand)
+        self.bus.add_object_lister(self.list_stored_messages)
+
+        if self.messages:
+            self.props['Messages'] = Variant('ao', list(self.messages))
+            self.emit_properties_changed({'Messages': self.props['Messages'].value})
+
+    def teardown(self):
+        # messages stay in the store, they are restored once the modem comes back
+        if self.messages_restored:
+            self.bus.remove_message_handler(self.export_on_demand)
+            self.bus.remove_object_lister(self.list_stored_messages)
+
+        for task in list(self.send_tasks.values()):
+            task.cancel()
+
+        for path in self.messages:
+            if path in self.exported_messages:
+                self.bus.unexport(path, self.exported_messages[path])
+            else:
+                self.bus.listed_object_removed(path, ['org.freedesktop.ModemManager1.Sms'])
+
+        self.exported_messages.clear()
+        self.messages.clear()
+        self.pending_sends.clear()
+        self.subscriptions.clear()
+
+    def export_on_demand(self, msg):
+        if msg.message_type != MessageType.METHOD_CALL or msg.path not in self.messages:
+            return
+
+        if msg.path in self.exported_messages:
+            self.exported_messages.move_to_end(msg.path)
+        else:
+            self.load_message(msg.path)
+
+    def list_stored_messages(self):
+        # object manager clients see every message, exported or not, from a single query
+        listed = {}
+        for row in sms_store.list(self.modem_name):
+            path = f'/org/freedesktop/ModemManager1/SMS/{row[0]}'
+            if path in self.messages and path not in self.exported_messages:
+                props = sms_props()
+                props.update(self.stored_props(row))
+                listed[path] = {'org.freedesktop.ModemManager1.Sms': props}
+
+        return listed
+
+    def stored_props(self, row):
+        message_id, state, pdu_type, number, text, timestamp, delivery_report_request = row
+        return {
+            'State': Variant('u', state),
+            'PduType': Variant('u', pdu_type),
+            'Number': Variant('s', number),
+            'Text': Variant('s', text),
+            'Timestamp': Variant('s', timestamp),
+            'DeliveryReportRequest': Variant('b', bool(delivery_report_request))
+        }
+
+    def load_message(self, path):
+        row = sms_store.get(self.messages[path])
+        if row is None:
+            return None
+
+        mm_sms_interface = MMSmsInterface(self.index, self.bus, self.ofono_client, self.modem_name, self.ofono_modem, self.ofono_props, self.ofono_interfaces, self.ofono_interface_props)
+        mm_sms_interface.props.update(self.stored_props(row))
+
+        # clients already know the message from the object manager, no need to announce it
+        self.export_sms_interface(path, mm_sms_interface, self.bus.export_listed)
+        return mm_sms_interface
+
+    def export_sms_interface(self, path, mm_sms_interface, export):
+        mm_sms_interface.mm_modem_messaging = self
+        mm_sms_interface.path = path
+        export(path, mm_sms_interface)
+        self.exported_messages[path] = mm_sms_interface
+        self.evict_messages()
+
+    def evict_messages(self):
+        # messages being sent or stored somewhere keep state the store does not have
+        sending = set(self.send_tasks) | set(pending[0] for pending in self.pending_sends.values())
+        idle = [path for path, mm_sms_interface in self.exported_messages.items() if path not in sending and mm_sms_interface.props['Storage'].value == 0]
+        while len(self.exported_messages) > self.max_exported_messages and idle:
+            path = idle.pop(0)
+            self.bus.unexport_listed(path, self.exported_messages.pop(path))
+
+    def add_message(self, mm_sms_interface, received):
+        message_id = sms_store.add(self.modem_name, mm_sms_interface.props)
+        path = f'/org/freedesktop/ModemManager1/SMS/{message_id}'
+
+        self.messages[path] = message_id
+        self.export_sms_interface(path, mm_sms_interface, self.bus.export)
+        self.props['Messages'] = Variant('ao', list(self.messages))
+        self.emit_properties_changed({'Messages': self.props['Messages'].value})
+        self.Added(path, received)
+        return path
 
     def add_incoming_message(self, msg, props):
-        global message_i
+        # ofono already reassembles concatenated messages, every IncomingMessage is one sms
         mm_sms_interface = MMSmsInterface(self.index, self.bus, self.ofono_client, self.modem_name, self.ofono_modem, self.ofono_props, self.ofono_interfaces, self.ofono_interface_props)
         mm_sms_interface.props.update({
             'State': Variant('u', 3), # hardcoded value received MM_SMS_STATE_RECEIVED
@@ -47,11 +168,109 @@ class MMModemMessagingInterface(ServiceInterface):
             'Timestamp': props['SentTime']
         })
 
-        self.bus.export(f'/org/freedesktop/ModemManager1/SMS/{message_i}', mm_sms_interface)
-        self.props['Messages'].value.append(f'/org/freedesktop/ModemManager1/SMS/{message_i}')
-        self.emit_properties_changed({'Messages': self.props['Messages'].value})
-        self.Added(f'/org/freedesktop/ModemManager1/SMS/{message_i}', True)
-        message_i += 1
+        self.add_message(mm_sms_interface, True)
+
+    def set_message_state(self, path, state):
+        if path not in self.messages:
+            return
+
+        sms_store.update_state(self.messages[path], state)
+        if path in self.exported_messages:
+            mm_sms_interface = self.exported_messages[path]
+            mm_sms_interface.props['State'] = Variant('u', state)
+            mm_sms_interface.emit_properties_changed({'State': state})
+
+    def get_sms_interface(self, path):
+        if path not in self.exported_messages:
+            raise DBusError('org.freedesktop.ModemManager1.Error.Core.NotFound', f'No message at {path}')
+
+        return self.exported_messages[path]
+
+    def store_message(self, path, storage):
+        mm_sms_interface = self.get_sms_interface(path)
+        mm_sms_interface.props['Storage'] = Variant('u', storage)
+        mm_sms_interface.emit_properties_changed({'Storage': storage})
+        if mm_sms_interface.props['State'].value == 0: # MM_SMS_STATE_UNKNOWN
+            self.set_message_state(path, 1) # MM_SMS_STATE_STORED
+
+    def queue_message(self, path):
+        mm_sms_interface = self.get_sms_interface(path)
+        state = mm_sms_interface.props['State'].value
+        if state in (2, 3): # MM_SMS_STATE_RECEIVING, MM_SMS_STATE_RECEIVED
+            raise DBusError('org.freedesktop.ModemManager1.Error.Core.WrongState', 'Received messages can not be sent')
+
+        # already queued, being sent or sent
+        if state not in (0, 1): # MM_SMS_STATE_UNKNOWN, MM_SMS_STATE_STORED
+            return
+
+        self.set_message_state(path, 4) # MM_SMS_STATE_SENDING
+        metrics.inc('sms.queued')
+        task = asyncio.get_event_loop().create_task(self.send_message(path, mm_sms_interface.props['Number'].value, mm_sms_interface.props['Text'].value, state))
+        self.send_tasks[path] = task
+        task.add_done_callback(lambda task: self.send_tasks.pop(path, None))
+
+    async def send_message(self, path, number, text, old_state):
+        queued = time.monotonic()
+        async with self.send_semaphore:
+            try:
+                ofono_message_path = await self.send_retry_policy.run(self.ofono_interfaces['org.ofono.MessageManager'].call_send_message, number, text)
+            except Exception as e:
+                metrics.inc('sms.send_failures')
+                self.set_message_state(path, old_state)
+                return
+
+        handler = lambda name, varval: self.ofono_message_changed(ofono_message_path, name, varval)
+        self.pending_sends[ofono_message_path] = (path, queued, handler)
+        try:
+            self.subscriptions.on(self.ofono_client["ofono_message"][ofono_message_path]['org.ofono.Message'], 'property_changed', handler)
+        except Exception as e:
+            pass
+
+    def ofono_message_changed(self, ofono_message_path, name, varval):
+        if name != 'State' or varval.value == 'pending' or ofono_message_path not in self.pending_sends:
+            return
+
+        self.finish_send(ofono_message_path, varval.value == 'sent')
+
+    def ofono_message_removed(self, ofono_message_path):
+        # ofono drops the message object once it is done, failed sends included. without
+        # its final state we can not tell whether it went out
+        if ofono_message_path in self.pending_sends:
+            self.finish_send(ofono_message_path, None)
+
+    def detach_send(self, ofono_message_path):
+        path, queued, handler = self.pending_sends.pop(ofono_message_path)
+        self.subscriptions.off(self.ofono_client["ofono_message"][ofono_message_path]['org.ofono.Message'], 'property_changed', handler)
+        self.ofono_client.evict(ofono_message_path)
+        return path, queued
+
+    async def cancel_send(self, path):
+        task = self.send_tasks.pop(path, None)
+        if task is not None:
+            task.cancel()
+
+        for ofono_message_path in [ofono_message_path for ofono_message_path, pending in self.pending_sends.items() if pending[0] == path]:
+            try:
+                await self.ofono_client["ofono_message"][ofono_message_path]['org.ofono.Message'].call_cancel()
+            except Exception as e:
+                pass
+
+            if ofono_message_path in self.pending_sends:
+                self.detach_send(ofono_message_path)
+
+    def finish_send(self, ofono_message_path, sent):
+        path, queued = self.detach_send(ofono_message_path)
+
+        if sent:
+            metrics.inc('sms.sent')
+            metrics.observe('sms.send_seconds', time.monotonic() - queued)
+            self.set_message_state(path, 5) # MM_SMS_STATE_SENT
+        elif sent is None:
+            metrics.inc('sms.send_unknown')
+            self.set_message_state(path, 0) # MM_SMS_STATE_UNKNOWN
+        else:
+            metrics.inc('sms.send_failures')
+            self.set_message_state(path, 1) # MM_SMS_STATE_STORED
 
     @method()
     async def List(self) -> 'ao':
@@ -59,15 +278,22 @@ class MMModemMessagingInterface(ServiceInterface):
 
     @method()
     async def Delete(self, path: 'o'):
-        if path in self.props['Messages'].value:
-            self.props['Messages'].value.remove(path)
-            self.bus.unexport(path)
+        if path in self.messages:
+            await self.cancel_send(path)
+            if path not in self.messages:
+                return
+
+            sms_store.remove(self.messages.pop(path))
+            if path in self.exported_messages:
+                self.bus.unexport(path, self.exported_messages.pop(path))
+            else:
+                self.bus.listed_object_removed(path, ['org.freedesktop.ModemManager1.Sms'])
+            self.props['Messages'] = Variant('ao', list(self.messages))
             self.emit_properties_changed({'Messages': self.props['Messages'].value})
             self.Deleted(path)
 
     @method()
     async def Create(self, properties: 'a{sv}') -> 'o':
-        global message_i
         if 'number' not in properties or 'text' not in properties:
             return
 
@@ -75,20 +301,16 @@ class MMModemMessagingInterface(ServiceInterface):
         mm_sms_interface.props.update({
             'Text': properties['text'],
             'Number': properties['number'],
+            'PduType': Variant('u', 2), # hardcoded value submit MM_SMS_PDU_TYPE_SUBMIT
             'DeliveryReportRequest': properties['delivery-report-request'] if 'delivery-report-request' in properties else Variant('b', False)
         })
 
-        self.bus.export(f'/org/freedesktop/ModemManager1/SMS/{message_i}', mm_sms_interface)
-        self.props['Messages'].value.append(f'/org/freedesktop/ModemManager1/SMS/{message_i}')
-        self.emit_properties_changed({'Messages': self.props['Messages'].value})
-        self.Added(f'/org/freedesktop/ModemManager1/SMS/{message_i}', True)
-        message_i_old = message_i
-        message_i += 1
+        path = self.add_message(mm_sms_interface, False)
 
         if 'org.ofono.MessageManager' in self.ofono_interfaces:
-            ofono_sms_path = await self.ofono_interfaces['org.ofono.MessageManager'].call_send_message(properties['number'].value, properties['text'].value)
+            self.queue_message(path)
 
-        return f'/org/freedesktop/ModemManager1/SMS/{message_i_old}'
+        return path
 
     @signal()
     def Added(self, path, received) -> 'ob':
@@ -109,15 +331,3 @@ class MMModemMessagingInterface(ServiceInterface):
     @dbus_property(access=PropertyAccess.READ)
     def DefaultStorage(self) -> 'u':
         return self.props['DefaultStorage'].value
-
-    def ofono_changed(self, name, varval):
-        self.ofono_props[name] = varval
-        self.set_props()
-
-    def ofono_interface_changed(self, iface):
-        def ch(name, varval):
-            if iface in self.ofono_interface_props:
-                self.ofono_interface_props[iface][name] = varval
-            self.set_props()
-
-        return ch
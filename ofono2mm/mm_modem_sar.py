@@ -2,7 +2,9 @@ from dbus_next.service import ServiceInterface, method, dbus_property
 from dbus_next.constants import PropertyAccess
 from dbus_next import Variant
 
-class MMModemSarInterface(ServiceInterface):
+from ofono2mm.utils import CoalescedServiceInterface
+
+class MMModemSarInterface(CoalescedServiceInterface):
     def __init__(self, mm_modem):
         super().__init__('org.freedesktop.ModemManager1.Modem.Sar')
         self.mm_modem = mm_modem
@@ -1,13 +1,98 @@
 from dbus_next.service import ServiceInterface, method, dbus_property, signal
 from dbus_next.constants import PropertyAccess
-from dbus_next import Variant
+from dbus_next import Variant, DBusError
+
+from ofono2mm.utils import CoalescedServiceInterface
+
+from array import array
+import math
+import time
+
+class SignalHistory:
+    """
+    A fixed-size rolling history of signal samples, one array('d') per
+    value so memory use stays bounded and statistics are computed in one
+    pass over the window. Missing values are stored as NaN.
+    """
+
+    keys = ('rssi', 'rsrp', 'rsrq', 'rscp', 'ecio', 'snr', 'error-rate')
+
+    def __init__(self, size=512):
+        self.size = size
+        self.times = array('d', [0.0]) * size
+        self.values = {key: array('d', [math.nan]) * size for key in self.keys}
+        self.count = 0
+        self.next = 0
+
+    def append(self, timestamp, values):
+        self.times[self.next] = timestamp
+        for key in self.keys:
+            self.values[key][self.next] = values.get(key, math.nan)
+
+        self.next = (self.next + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def statistics(self, window):
+        since = time.monotonic() - window if window != 0 else -math.inf
+        indexes = [i for i in range(self.size) if i < self.count and self.times[i] >= since]
+
+        stats = {}
+        for key in self.keys:
+            samples = sorted(self.values[key][i] for i in indexes if not math.isnan(self.values[key][i]))
+            if not samples:
+                continue
+
+            stats[key] = {
+                'count': float(len(samples)),
+                'min': samples[0],
+                'max': samples[-1],
+                'mean': math.fsum(samples) / len(samples),
+                'p50': samples[(len(samples) - 1) * 50 // 100],
+                'p90': samples[(len(samples) - 1) * 90 // 100],
+                'p99': samples[(len(samples) - 1) * 99 // 100],
+            }
+
+        return stats
+
+class NetworkMonitorAgentInterface(ServiceInterface):
+    def __init__(self, mm_modem_signal):
+        super().__init__('org.ofono.NetworkMonitorAgent')
+        self.mm_modem_signal = mm_modem_signal
+
+    @method()
+    def ServingCellInformationChanged(self, cellinfo: 'a{sv}'):
+        self.mm_modem_signal.add_sample(cellinfo)
+
+    @method()
+    def Release(self):
+        self.mm_modem_signal.agent_released()
+
+class MMModemSignalInterface(CoalescedServiceInterface):
+    # ofono technology: the property holding its signal values
+    technology_props = {
+        'gsm': 'Gsm',
+        'edge': 'Gsm',
+        'gprs': 'Gsm',
+        'umts': 'Umts',
+        'hspa': 'Umts',
+        'hsdpa': 'Umts',
+        'hsupa': 'Umts',
+        'lte': 'Lte',
+        'nr': 'Nr5g',
+    }
 
-class MMModemSignalInterface(ServiceInterface):
     def __init__(self, mm_modem, ofono_interfaces, ofono_interface_props):
         super().__init__('org.freedesktop.ModemManager1.Modem.Signal')
         self.mm_modem = mm_modem
         self.ofono_interfaces = ofono_interfaces
         self.ofono_interface_props = ofono_interface_props
+        self.agent = None
+        self.agent_path = f'/org/droidian/ofono2mm/NetworkMonitorAgent/{mm_modem.index}'
+        self.agent_registered = False
+        self.poll_handle = None
+        self.threshold_period = 5 # seconds between samples when only thresholds are set
+        self.history = SignalHistory()
+        self.emitted_values = {}
         self.props = {
             'Rate': Variant('u', 0),
             'RssiThreshold': Variant('u', 0),
@@ -49,63 +134,148 @@ class MMModemSignalInterface(ServiceInterface):
             })
         }
 
-    async def set_props(self):
-        if 'org.ofono.NetworkMonitor' in self.ofono_interface_props:
-            self.props['Cdma'].value['rssi'] = Variant('d', self.ofono_interface_props['org.ofono.NetworkMonitor']['ReceivedSignalStrength'].value if "ReceivedSignalStrength" in self.ofono_interface_props['org.ofono.NetworkMonitor'] else 0)
-            self.props['Evdo'].value['rssi'] = Variant('d', self.ofono_interface_props['org.ofono.NetworkMonitor']['ReceivedSignalStrength'].value if "ReceivedSignalStrength" in self.ofono_interface_props['org.ofono.NetworkMonitor'] else 0)
-            self.props['Gsm'].value['rssi'] = Variant('d', self.ofono_interface_props['org.ofono.NetworkMonitor']['ReceivedSignalStrength'].value if "ReceivedSignalStrength" in self.ofono_interface_props['org.ofono.NetworkMonitor'] else 0)
-            self.props['Umts'].value['rssi'] = Variant('d', self.ofono_interface_props['org.ofono.NetworkMonitor']['ReceivedSignalStrength'].value if "ReceivedSignalStrength" in self.ofono_interface_props['org.ofono.NetworkMonitor'] else 0)
-            self.props['Lte'].value['rssi'] = Variant('d', self.ofono_interface_props['org.ofono.NetworkMonitor']['ReceivedSignalStrength'].value if "ReceivedSignalStrength" in self.ofono_interface_props['org.ofono.NetworkMonitor'] else 0)
-
-            self.props['Cdma'].value['error-rate'] = Variant('d', self.ofono_interface_props['org.ofono.NetworkMonitor']['BitErrorRate'].value if "BitErrorRate" in self.ofono_interface_props['org.ofono.NetworkMonitor'] else 0)
-            self.props['Evdo'].value['error-rate'] = Variant('d', self.ofono_interface_props['org.ofono.NetworkMonitor']['BitErrorRate'].value if "BitErrorRate" in self.ofono_interface_props['org.ofono.NetworkMonitor'] else 0)
-            self.props['Gsm'].value['error-rate'] = Variant('d', self.ofono_interface_props['org.ofono.NetworkMonitor']['BitErrorRate'].value if "BitErrorRate" in self.ofono_interface_props['org.ofono.NetworkMonitor'] else 0)
-            self.props['Umts'].value['error-rate'] = Variant('d', self.ofono_interface_props['org.ofono.NetworkMonitor']['BitErrorRate'].value if "BitErrorRate" in self.ofono_interface_props['org.ofono.NetworkMonitor'] else 0)
-            self.props['Lte'].value['error-rate'] = Variant('d', self.ofono_interface_props['org.ofono.NetworkMonitor']['BitErrorRate'].value if "BitErrorRate" in self.ofono_interface_props['org.ofono.NetworkMonitor'] else 0)
-            self.props['Nr5g'].value['error-rate'] = Variant('d', self.ofono_interface_props['org.ofono.NetworkMonitor']['BitErrorRate'].value if "BitErrorRate" in self.ofono_interface_props['org.ofono.NetworkMonitor'] else 0)
-
-            self.props['Lte'].value['rsrq'] = Variant('d', self.ofono_interface_props['org.ofono.NetworkMonitor']['ReferenceSignalReceivedQuality'].value if "ReferenceSignalReceivedQuality" in self.ofono_interface_props['org.ofono.NetworkMonitor'] else 0)
-            self.props['Nr5g'].value['rsrq'] = Variant('d', self.ofono_interface_props['org.ofono.NetworkMonitor']['ReferenceSignalReceivedQuality'].value if "ReferenceSignalReceivedQuality" in self.ofono_interface_props['org.ofono.NetworkMonitor'] else 0)
-
-            self.props['Lte'].value['rsrp'] = Variant('d', self.ofono_interface_props['org.ofono.NetworkMonitor']['ReferenceSignalReceivedPower'].value if "ReferenceSignalReceivedPower" in self.ofono_interface_props['org.ofono.NetworkMonitor'] else 0)
-            self.props['Nr5g'].value['rsrp'] = Variant('d', self.ofono_interface_props['org.ofono.NetworkMonitor']['ReferenceSignalReceivedPower'].value if "ReferenceSignalReceivedPower" in self.ofono_interface_props['org.ofono.NetworkMonitor'] else 0)
-
-            self.props['Umts'].value['rscp'] = Variant('d', self.ofono_interface_props['org.ofono.NetworkMonitor']['ReceivedSignalCodePower'].value if "ReceivedSignalCodePower" in self.ofono_interface_props['org.ofono.NetworkMonitor'] else 0)
-        else:
-            self.props['Cdma'].value['rssi'] = Variant('d', 0)
-            self.props['Evdo'].value['rssi'] = Variant('d', 0)
-            self.props['Gsm'].value['rssi'] = Variant('d', 0)
-            self.props['Umts'].value['rssi'] = Variant('d', 0)
-            self.props['Lte'].value['rssi'] = Variant('d', 0)
-
-            self.props['Cdma'].value['error-rate'] = Variant('d', 0)
-            self.props['Evdo'].value['error-rate'] = Variant('d', 0)
-            self.props['Gsm'].value['error-rate'] = Variant('d', 0)
-            self.props['Umts'].value['error-rate'] = Variant('d', 0)
-            self.props['Lte'].value['error-rate'] = Variant('d', 0)
-            self.props['Nr5g'].value['error-rate'] = Variant('d', 0)
-
-            self.props['Lte'].value['rsrq'] = Variant('d', 0)
-            self.props['Nr5g'].value['rsrq'] = Variant('d', 0)
-
-            self.props['Lte'].value['rsrp'] = Variant('d', 0)
-            self.props['Nr5g'].value['rsrp'] = Variant('d', 0)
-
-            self.props['Umts'].value['rscp'] = Variant('d', 0)
+    def get_period(self):
+        if self.props['Rate'].value != 0:
+            return self.props['Rate'].value
+
+        # thresholds alone still need samples to compare against
+        if self.props['RssiThreshold'].value != 0 or self.props['ErrorRateThreshold'].value:
+            return self.threshold_period
+
+        return 0
+
+    async def start_sampling(self):
+        await self.stop_sampling()
+
+        period = self.get_period()
+        if period == 0 or 'org.ofono.NetworkMonitor' not in self.ofono_interfaces:
+            return
+
+        # let ofono push the serving cell information, if the modem does not support that poll it ourselves
+        if self.agent is None:
+            self.agent = NetworkMonitorAgentInterface(self)
+            self.mm_modem.bus.export(self.agent_path, self.agent)
+
+        try:
+            await self.ofono_interfaces['org.ofono.NetworkMonitor'].call_register_agent(self.agent_path, period)
+            self.agent_registered = True
+        except DBusError:
+            self.poll_handle = self.mm_modem.loop.call_later(period, self.poll)
+
+        await self.poll_once()
+
+    async def stop_sampling(self):
+        if self.poll_handle is not None:
+            self.poll_handle.cancel()
+            self.poll_handle = None
+
+        if self.agent_registered:
+            self.agent_registered = False
+            try:
+                await self.ofono_interfaces['org.ofono.NetworkMonitor'].call_unregister_agent(self.agent_path)
+            except Exception as e:
+                pass
+
+    def teardown(self):
+        # the ofono modem is gone, there is no agent left to unregister
+        if self.poll_handle is not None:
+            self.poll_handle.cancel()
+            self.poll_handle = None
+
+        self.agent_registered = False
+        if self.agent is not None:
+            self.mm_modem.bus.unexport(self.agent_path, self.agent)
+            self.agent = None
+
+    def poll(self):
+        self.poll_handle = self.mm_modem.loop.call_later(self.get_period(), self.poll)
+        self.mm_modem.loop.create_task(self.poll_once())
+
+    async def poll_once(self):
+        if 'org.ofono.NetworkMonitor' not in self.ofono_interfaces:
+            return
+
+        try:
+            cellinfo = await self.ofono_interfaces['org.ofono.NetworkMonitor'].call_get_serving_cell_information()
+        except DBusError:
+            return
+
+        self.add_sample(cellinfo)
+
+    def agent_released(self):
+        self.agent_registered = False
+        if self.get_period() != 0 and self.poll_handle is None:
+            self.poll_handle = self.mm_modem.loop.call_later(self.get_period(), self.poll)
+
+    def add_sample(self, cellinfo):
+        values = {}
+        # ofono reports the 3gpp ts 27.007 indexes, modemmanager wants dBm and dB
+        if 'ReceivedSignalStrength' in cellinfo:
+            values['rssi'] = -113 + 2 * cellinfo['ReceivedSignalStrength'].value
+        if 'BitErrorRate' in cellinfo:
+            values['error-rate'] = cellinfo['BitErrorRate'].value
+        if 'ReferenceSignalReceivedPower' in cellinfo:
+            values['rsrp'] = -140 + cellinfo['ReferenceSignalReceivedPower'].value
+        if 'ReferenceSignalReceivedQuality' in cellinfo:
+            values['rsrq'] = -19.5 + cellinfo['ReferenceSignalReceivedQuality'].value / 2
+        if 'ReceivedSignalCodePower' in cellinfo:
+            values['rscp'] = -120 + cellinfo['ReceivedSignalCodePower'].value
+        if 'ECN0' in cellinfo:
+            values['ecio'] = -24.5 + cellinfo['ECN0'].value / 2
+
+        self.history.append(time.monotonic(), values)
+
+        prop = self.technology_props.get(cellinfo.get('Technology', Variant('s', '')).value)
+        changed_props = {}
+        for name in self.technology_props.values():
+            if name == prop:
+                new_value = {key: Variant('d', values.get(key, 0)) for key in self.props[name].value}
+            else:
+                new_value = {key: Variant('d', 0) for key in self.props[name].value}
+
+            if new_value != self.props[name].value:
+                self.props[name] = Variant('a{sv}', new_value)
+                changed_props[name] = new_value
+
+        if not changed_props or not self.crosses_thresholds(values):
+            return
+
+        self.emitted_values = values
+        self.emit_properties_changed(changed_props)
+
+    def crosses_thresholds(self, values):
+        if self.props['RssiThreshold'].value == 0 and not self.props['ErrorRateThreshold'].value:
+            return True
+
+        if self.props['RssiThreshold'].value != 0:
+            if abs(values.get('rssi', 0) - self.emitted_values.get('rssi', 0)) >= self.props['RssiThreshold'].value:
+                return True
+        if self.props['ErrorRateThreshold'].value:
+            if values.get('error-rate', 0) != self.emitted_values.get('error-rate', 0):
+                return True
+
+        return False
 
     @method()
     async def Setup(self, rate: 'u'):
+        self.props['Rate'] = Variant('u', rate)
+        self.emit_properties_changed({'Rate': rate})
+
         try:
-            await self.set_props()
+            await self.start_sampling()
         except Exception as e:
             pass
 
-        self.props['Rate'] = Variant('u', rate)
-
     @method()
-    def SetupThresholds(self, settings: 'a{sv}'):
+    async def SetupThresholds(self, settings: 'a{sv}'):
         self.props['RssiThreshold'] = Variant('u', settings.get('rssi-threshold', Variant('u', 0)).value)
         self.props['ErrorRateThreshold'] = Variant('b', settings.get('error-rate-threshold', Variant('b', False)).value)
+        self.emit_properties_changed({'RssiThreshold': self.props['RssiThreshold'].value, 'ErrorRateThreshold': self.props['ErrorRateThreshold'].value})
+
+        try:
+            await self.start_sampling()
+        except Exception as e:
+            pass
 
     @dbus_property(access=PropertyAccess.READ)
     def Rate(self) -> 'u':
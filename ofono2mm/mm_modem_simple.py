@@ -2,14 +2,17 @@ from dbus_next.service import (ServiceInterface, method, dbus_property, signal)
 from dbus_next.constants import PropertyAccess
 from dbus_next import Variant
 
-class MMModemSimpleInterface(ServiceInterface):
+from ofono2mm.mappings import ACCESS_TECHNOLOGIES, MODEM_STATES, MODEM_STATE_ENABLED, MODEM_STATE_REGISTERED, REGISTRATION_STATES, REGISTRATION_STATE_UNKNOWN
+from ofono2mm.utils import CoalescedServiceInterface
+
+class MMModemSimpleInterface(CoalescedServiceInterface):
     def __init__(self, mm_modem, ofono_interfaces, ofono_interface_props):
         super().__init__('org.freedesktop.ModemManager1.Modem.Simple')
         self.mm_modem = mm_modem
         self.ofono_interfaces = ofono_interfaces
         self.ofono_interface_props = ofono_interface_props
         self.props = {
-             'state': Variant('u', 7), # on runtime enabled MM_MODEM_STATE_ENABLED
+             'state': Variant('u', 6), # on runtime enabled MM_MODEM_STATE_ENABLED
              'signal-quality': Variant('(ub)', [0, True]),
              'current-bands': Variant('au', []),
              'access-technologies': Variant('u', 0), # on runtime unknown MM_MODEM_ACCESS_TECHNOLOGY_UNKNOWN
@@ -43,45 +46,22 @@ class MMModemSimpleInterface(ServiceInterface):
                 self.props['signal-quality'] = Variant('(ub)', [self.ofono_interface_props['org.ofono.NetworkRegistration']['Strength'].value, True])
 
             if 'Status' in self.ofono_interface_props['org.ofono.NetworkRegistration']:
-                if self.ofono_interface_props['org.ofono.NetworkRegistration']['Status'].value == 'registered' or self.ofono_interface_props['org.ofono.NetworkRegistration']['Status'].value == 'roaming':
-                    self.props['state'] = Variant('u', 9) # registered MM_MODEM_STATE_REGISTERED
-                elif self.ofono_interface_props['org.ofono.NetworkRegistration']['Status'].value == 'searching':
-                    self.props['state'] = Variant('u', 8) # searching MM_MODEM_STATE_SEARCHING
-                else:
-                    self.props['state'] = Variant('u', 7) # enabled MM_MODEM_STATE_ENABLED
-
-            if 'Status' in self.ofono_interface_props['org.ofono.NetworkRegistration']:
-                if self.ofono_interface_props['org.ofono.NetworkRegistration']['Status'].value == "unregisered":
-                    self.props['m3gpp-registration-state'] = Variant('u', 0) # idle MM_MODEM_3GPP_REGISTRATION_STATE_IDLE
-                elif self.ofono_interface_props['org.ofono.NetworkRegistration']['Status'].value == "registered":
-                    self.props['m3gpp-registration-state'] = Variant('u', 1) # home MM_MODEM_3GPP_REGISTRATION_STATE_HOME
-                elif self.ofono_interface_props['org.ofono.NetworkRegistration']['Status'].value == "searching":
-                    self.props['m3gpp-registration-state'] = Variant('u', 2) # searching MM_MODEM_3GPP_REGISTRATION_STATE_SEARCHING
-                elif self.ofono_interface_props['org.ofono.NetworkRegistration']['Status'].value == "denied":
-                    self.props['m3gpp-registration-state'] = Variant('u', 3) # denied MM_MODEM_3GPP_REGISTRATION_STATE_DENIED
-                elif self.ofono_interface_props['org.ofono.NetworkRegistration']['Status'].value == "unknown":
-                    self.props['m3gpp-registration-state'] = Variant('u', 4) # unknown MM_MODEM_3GPP_REGISTRATION_STATE_UNKNOWN
-                elif self.ofono_interface_props['org.ofono.NetworkRegistration']['Status'].value == "roaming":
-                    self.props['m3gpp-registration-state'] = Variant('u', 5) # MM_MODEM_3GPP_REGISTRATION_STATE_ROAMING
+                self.props['state'] = Variant('u', MODEM_STATES.get(self.ofono_interface_props['org.ofono.NetworkRegistration']['Status'].value, MODEM_STATE_ENABLED))
+                self.props['m3gpp-registration-state'] = Variant('u', REGISTRATION_STATES.get(self.ofono_interface_props['org.ofono.NetworkRegistration']['Status'].value, REGISTRATION_STATE_UNKNOWN))
             else:
                 self.props['m3gpp-registration-state'] = Variant('u', 4) # unknown MM_MODEM_3GPP_REGISTRATION_STATE_UNKNOWN
         else:
             self.props['m3gpp-operator-name'] = Variant('s', '')
             self.props['m3gpp-operator-code'] = Variant('s', '')
             self.props['signal-quality'] = Variant('(ub)', [0, True])
-            self.props['state'] = Variant('u', 7) # enabled MM_MODEM_STATE_ENABLED
+            self.props['state'] = Variant('u', MODEM_STATE_ENABLED)
 
-        if 'org.ofono.NetworkRegistration' in self.ofono_interface_props and self.props['state'].value == 7:
+        if 'org.ofono.NetworkRegistration' in self.ofono_interface_props and self.props['state'].value == MODEM_STATE_REGISTERED:
             if "Technology" in self.ofono_interface_props['org.ofono.NetworkRegistration']:
                 current_tech = 0
-                if self.ofono_interface_props['org.ofono.NetworkRegistration']["Technology"].value == "nr":
-                    current_tech |= 1 << 15 # network is 5g MM_MODEM_ACCESS_TECHNOLOGY_5GNR
-                elif self.ofono_interface_props['org.ofono.NetworkRegistration']["Technology"].value == "lte":
-                    current_tech |= 1 << 14 # network is lte MM_MODEM_ACCESS_TECHNOLOGY_LTE
-                elif self.ofono_interface_props['org.ofono.NetworkRegistration']["Technology"].value == "umts" or self.ofono_interface_props['org.ofono.NetworkRegistration']["Technology"].value == "hspa" or self.ofono_interface_props['org.ofono.NetworkRegistration']["Technology"].value == "hsdpa" or self.ofono_interface_props['org.ofono.NetworkRegistration']["Technology"].value == "hsupa":
-                    current_tech |= 1 << 5 # network is umts MM_MODEM_ACCESS_TECHNOLOGY_UMTS
-                elif self.ofono_interface_props['org.ofono.NetworkRegistration']["Technology"].value == "gsm" or self.ofono_interface_props['org.ofono.NetworkRegistration']["Technology"].value == "edge" or self.ofono_interface_props['org.ofono.NetworkRegistration']["Technology"].value == "gprs":
-                    current_tech |= 1 << 1 # network is gsm MM_MODEM_ACCESS_TECHNOLOGY_GSM
+                ofono_tech = self.ofono_interface_props['org.ofono.NetworkRegistration']["Technology"].value
+                if ofono_tech in ACCESS_TECHNOLOGIES:
+                    current_tech = ACCESS_TECHNOLOGIES[ofono_tech][0]
 
                 self.props['access-technologies'] = Variant('u', current_tech)
             else:
@@ -108,7 +88,7 @@ class MMModemSimpleInterface(ServiceInterface):
             bearer = await self.mm_modem.doCreateBearer(properties)
             await self.mm_modem.bearers[bearer].doConnect()
         except Exception as e:
-            bearer = f'/org/freedesktop/ModemManager/Bearer/0'
+            bearer = '/'
 
         return bearer
 
@@ -3,7 +3,9 @@ from dbus_next.service import (ServiceInterface, method, dbus_property, signal)
 from dbus_next.constants import PropertyAccess
 from dbus_next import Variant
 
-class MMModemTimeInterface(ServiceInterface):
+from ofono2mm.utils import CoalescedServiceInterface, SignalSubscriptions
+
+class MMModemTimeInterface(CoalescedServiceInterface):
     def __init__(self, index, bus, ofono_client, modem_name, ofono_modem, ofono_props, ofono_interfaces, ofono_interface_props):
         super().__init__('org.freedesktop.ModemManager1.Modem.Time')
         self.index = index
@@ -15,6 +17,7 @@ class MMModemTimeInterface(ServiceInterface):
         self.ofono_interfaces = ofono_interfaces
         self.ofono_interface_props = ofono_interface_props
         self.ofono_modem = self.ofono_proxy['org.ofono.Modem']
+        self.subscriptions = SignalSubscriptions()
         self.network_time = datetime.now().isoformat()
         self.network_timezone = {
             'offset': Variant('i', 0),
@@ -24,7 +27,7 @@ class MMModemTimeInterface(ServiceInterface):
 
     async def init_time(self):
         if 'org.ofono.NetworkTime' in self.ofono_interfaces:
-            self.ofono_interfaces['org.ofono.NetworkTime'].on_network_time_changed(self.update_time)
+            self.subscriptions.on(self.ofono_interfaces['org.ofono.NetworkTime'], 'network_time_changed', self.update_time)
 
     async def update_time(self, time):
         # print(time)
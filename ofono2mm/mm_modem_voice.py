@@ -3,13 +3,23 @@ from dbus_next.constants import PropertyAccess
 from dbus_next import Variant
 
 from ofono2mm.mm_call import MMCallInterface
+from ofono2mm.mappings import CALL_STATES
+from ofono2mm.metrics import metrics
+from ofono2mm.object_paths import object_paths
+from ofono2mm.utils import CoalescedServiceInterface, SignalSubscriptions
 
+import asyncio
 import time
 
-call_i = 1
+class MMModemVoiceInterface(CoalescedServiceInterface):
+    ofono_inputs = [
+        ('org.ofono.SimManager', 'FixedDialing'),
+    ]
 
-class MMModemVoiceInterface(ServiceInterface):
-    def __init__(self, index, bus, ofono_client, modem_name, ofono_modem, ofono_props, ofono_interfaces, ofono_interface_props):
+    # incoming call stages take well under the default millisecond buckets
+    ring_buckets = [0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1]
+
+    def __init__(self, index, bus, ofono_client, modem_name, ofono_modem, ofono_props, ofono_interfaces, ofono_interface_props, mm_modem):
         super().__init__('org.freedesktop.ModemManager1.Modem.Voice')
         self.index = index
         self.bus = bus
@@ -20,99 +30,172 @@ class MMModemVoiceInterface(ServiceInterface):
         self.ofono_props = ofono_props
         self.ofono_interfaces = ofono_interfaces
         self.ofono_interface_props = ofono_interface_props
+        self.mm_modem = mm_modem
+        self.reactivate_task = None
+        self.reactivate_delay = 2 # seconds the carrier gets to bring data back by itself
+        self.reactivate_timeout = 10
+        self.subscriptions = SignalSubscriptions()
+        self.calls = {} # call object path: call interface
+        self.voicecalls = {} # ofono voicecall path: call object path
         self.props = {
             'Calls': Variant('ao', []),
             'EmergencyOnly': Variant('b', False),
         }
 
     def set_props(self):
-        old_props = self.props
-
-        for prop in self.props:
-            if self.props[prop].value != old_props[prop].value:
-                self.emit_properties_changed({prop: self.props[prop].value})
+        old_props = self.props.copy()
 
-    async def init_calls(self):
-        if 'org.ofono.SimManager' in self.ofono_interfaces and 'FixedDialing' in self.ofono_interface_props['org.ofono.SimManager']:
+        if 'org.ofono.SimManager' in self.ofono_interface_props and 'FixedDialing' in self.ofono_interface_props['org.ofono.SimManager']:
             self.props['EmergencyOnly'] = Variant('b', self.ofono_interface_props['org.ofono.SimManager']['FixedDialing'].value)
         else:
             self.props['EmergencyOnly'] = Variant('b', False)
 
-        if 'org.ofono.VoiceCallManager' in self.ofono_interfaces:
-            self.ofono_interfaces['org.ofono.VoiceCallManager'].on_call_added(self.add_call)
+        changed_props = {}
+        for prop in self.props:
+            if self.props[prop].value != old_props[prop].value:
+                changed_props.update({ prop: self.props[prop].value })
+
+        self.emit_properties_changed(changed_props)
 
+    async def init_calls(self):
         if 'org.ofono.VoiceCallManager' in self.ofono_interfaces:
-            self.ofono_interfaces['org.ofono.VoiceCallManager'].on_call_removed(self.remove_call)
+            self.subscriptions.on(self.ofono_interfaces['org.ofono.VoiceCallManager'], 'call_added', self.add_call)
+            self.subscriptions.on(self.ofono_interfaces['org.ofono.VoiceCallManager'], 'call_removed', self.remove_call)
 
-    async def add_call(self, path, props):
-        if props['State'].value == 'incoming':
-            global call_i
-
-            if 'org.ofono.SimManager' in self.ofono_interfaces and 'FixedDialing' in self.ofono_interface_props['org.ofono.SimManager']:
-                self.props['EmergencyOnly'] = Variant('b', self.ofono_interface_props['org.ofono.SimManager']['FixedDialing'].value)
-            else:
-                self.props['EmergencyOnly'] = Variant('b', False)
-
-            mm_call_interface = MMCallInterface(self.index, self.bus, self.ofono_client, self.modem_name, self.ofono_modem, self.ofono_props, self.ofono_interfaces, self.ofono_interface_props)
-            mm_call_interface.props.update({
-                'State': Variant('u', 3), # ringing in MM_CALL_STATE_RINGING_IN
-                'StateReason': Variant('u', 2), # incoming new MM_CALL_STATE_REASON_INCOMING_NEW
-                'Direction': Variant('u', 1), # incoming MM_CALL_DIRECTION_INCOMING
-                'Number': Variant('s', props['LineIdentification'].value),
-                'Multiparty': props['Multiparty'],
-            })
-
-            mm_call_interface.voicecall = path
-            self.bus.export(f'/org/freedesktop/ModemManager1/Call/{call_i}', mm_call_interface)
-            self.props['Calls'].value.append(f'/org/freedesktop/ModemManager1/Call/{call_i}')
-            self.emit_properties_changed({'Calls': self.props['Calls'].value})
-            self.CallAdded(f'/org/freedesktop/ModemManager1/Call/{call_i}')
-            call_i += 1
+    def add_mm_call(self, mm_call_interface, voicecall, timings=None):
+        mm_call_path = object_paths.allocate('Call', self.mm_modem)
 
-    async def remove_call(self, path):
-        global call_i
+        mm_call_interface.voicecall = voicecall
+        self.bus.export(mm_call_path, mm_call_interface)
+        if timings is not None:
+            timings['exported'] = time.monotonic()
 
-        call_i -= 1
+        mm_call_interface.start_tracking()
+        self.calls[mm_call_path] = mm_call_interface
+        if voicecall != '/':
+            self.voicecalls[voicecall] = mm_call_path
 
-        try:
-            self.props['Calls'].value.remove(f'/org/freedesktop/ModemManager1/Call/{call_i}')
-            self.bus.unexport(f'/org/freedesktop/ModemManager1/Call/{call_i}')
-            self.emit_properties_changed({'Calls': self.props['Calls'].value})
-            self.CallDeleted(f'/org/freedesktop/ModemManager1/Call/{call_i}')
-        except Exception as e:
-            pass
+        self.props['Calls'] = Variant('ao', list(self.calls))
+        self.emit_properties_changed({'Calls': self.props['Calls'].value})
+        self.CallAdded(mm_call_path)
+        if timings is not None:
+            timings['emitted'] = time.monotonic()
+
+        return mm_call_path
+
+    def remove_mm_call(self, mm_call_path):
+        mm_call_interface = self.calls.pop(mm_call_path, None)
+        if mm_call_interface is None:
+            return
+
+        self.voicecalls.pop(mm_call_interface.voicecall, None)
+        mm_call_interface.stop_tracking()
+        if mm_call_interface.voicecall != '/':
+            self.ofono_client.evict(mm_call_interface.voicecall)
+        self.bus.unexport(mm_call_path, mm_call_interface)
+        object_paths.release(mm_call_path)
+        self.props['Calls'] = Variant('ao', list(self.calls))
+        self.emit_properties_changed({'Calls': self.props['Calls'].value})
+        self.CallDeleted(mm_call_path)
 
-        if 'org.ofono.SimManager' in self.ofono_interfaces and 'FixedDialing' in self.ofono_interface_props['org.ofono.SimManager']:
-            self.props['EmergencyOnly'] = Variant('b', self.ofono_interface_props['org.ofono.SimManager']['FixedDialing'].value)
+    def teardown(self):
+        # the calls went away with the modem, drop their objects without hanging up
+        self.cancel_context_reactivation()
+        for mm_call_path, mm_call_interface in list(self.calls.items()):
+            mm_call_interface.subscriptions.clear()
+            self.bus.unexport(mm_call_path, mm_call_interface)
+
+        self.calls.clear()
+        self.voicecalls.clear()
+        self.subscriptions.clear()
+
+    async def add_call(self, path, props):
+        received = time.monotonic()
+        if path in self.voicecalls:
+            return
+
+        # calls dialed by other ofono clients or the sim toolkit get their call object as well
+        if props['State'].value not in CALL_STATES or props['State'].value == 'disconnected':
+            return
+
+        self.cancel_context_reactivation()
+
+        state, reason = CALL_STATES[props['State'].value]
+        if props['State'].value in ('incoming', 'waiting'):
+            direction = 1 # MM_CALL_DIRECTION_INCOMING
+        elif props['State'].value in ('dialing', 'alerting'):
+            direction = 2 # MM_CALL_DIRECTION_OUTGOING
         else:
-            self.props['EmergencyOnly'] = Variant('b', False)
+            direction = 0 # MM_CALL_DIRECTION_UNKNOWN
+
+        mm_call_interface = MMCallInterface(self.index, self.bus, self.ofono_client, self.modem_name, self.ofono_modem, self.ofono_props, self.ofono_interfaces, self.ofono_interface_props)
+        mm_call_interface.props.update({
+            'State': Variant('u', state),
+            'StateReason': Variant('u', reason),
+            'Direction': Variant('u', direction),
+            'Number': Variant('s', props['LineIdentification'].value if 'LineIdentification' in props else ''),
+            'Multiparty': props['Multiparty'] if 'Multiparty' in props else Variant('b', False),
+        })
+        constructed = time.monotonic()
+
+        if direction != 1: # MM_CALL_DIRECTION_INCOMING
+            self.add_mm_call(mm_call_interface, path)
+            return
+
+        # time from ofono's CallAdded reaching us to our CallAdded going out, split by stage
+        timings = {}
+        self.add_mm_call(mm_call_interface, path, timings)
+        metrics.observe('voice.ring.construct_seconds', constructed - received, self.ring_buckets)
+        metrics.observe('voice.ring.export_seconds', timings['exported'] - constructed, self.ring_buckets)
+        metrics.observe('voice.ring.emit_seconds', timings['emitted'] - timings['exported'], self.ring_buckets)
+        metrics.observe('voice.ring.total_seconds', timings['emitted'] - received, self.ring_buckets)
+
+    async def remove_call(self, path):
+        if path in self.voicecalls:
+            self.remove_mm_call(self.voicecalls[path])
 
         # print(f"call deleted: {path}")
-        if 'org.ofono.ConnectionManager' in self.ofono_interfaces:
-            contexts = await self.ofono_interfaces['org.ofono.ConnectionManager'].call_get_contexts()
-            self.context_names = []
-            ctx_idx = 0
-            chosen_apn = None
-            chosen_ctx_path = None
-            for ctx in contexts:
-                name = ctx[1].get('Type', Variant('s', '')).value
-                access_point_name = ctx[1].get('AccessPointName', Variant('s', '')).value
-                if name.lower() == "internet":
-                    ctx_idx += 1
-                    if access_point_name:
-                        self.context_names.append(access_point_name)
-                        chosen_apn = access_point_name
-                        chosen_ctx_path = ctx[0]
-
-                if chosen_ctx_path:
-                    # print(f'activate context on apn {chosen_apn}')
-                    chosen_ctx_interface = self.ofono_client["ofono_context"][chosen_ctx_path]['org.ofono.ConnectionContext']
-                    # on some carriers context does not get reactivated after a call automatically, lets do it ourselves just in case
-                    time.sleep(2) # wait a bit for the call to end
-                    try:
-                        await chosen_ctx_interface.call_set_property("Active", Variant('b', True))
-                    except Exception as e:
-                        pass
+        if not self.calls and 'org.ofono.ConnectionManager' in self.ofono_interfaces:
+            self.schedule_context_reactivation()
+
+    def schedule_context_reactivation(self):
+        # calls ending back to back only reactivate once, after the last one
+        self.cancel_context_reactivation()
+        self.reactivate_task = asyncio.create_task(self.reactivate_context(time.monotonic()))
+
+    def cancel_context_reactivation(self):
+        if self.reactivate_task is not None:
+            self.reactivate_task.cancel()
+            self.reactivate_task = None
+
+    async def reactivate_context(self, call_ended):
+        chosen_ctx_path = self.mm_modem.get_internet_context()
+        if not chosen_ctx_path:
+            self.reactivate_task = None
+            return
+
+        # the context stayed up through the call, there is no downtime to record
+        if self.mm_modem.ofono_contexts[chosen_ctx_path].get('Active', Variant('b', False)).value:
+            self.reactivate_task = None
+            return
+
+        # on some carriers context does not get reactivated after a call automatically, lets do it ourselves just in case
+        if not await self.mm_modem.wait_ofono_context_active(chosen_ctx_path, self.reactivate_delay):
+            chosen_ctx_interface = self.ofono_client["ofono_context"][chosen_ctx_path]['org.ofono.ConnectionContext']
+            try:
+                await chosen_ctx_interface.call_set_property("Active", Variant('b', True))
+            except Exception as e:
+                pass
+
+            if not await self.mm_modem.wait_ofono_context_active(chosen_ctx_path, self.reactivate_timeout):
+                metrics.inc('voice.data_reactivation_failures')
+                self.reactivate_task = None
+                return
+
+            metrics.inc('voice.data_reactivations')
+
+        metrics.observe('voice.data_downtime_seconds', time.monotonic() - call_ended)
+        self.reactivate_task = None
 
     @method()
     async def ListCalls(self) -> 'ao':
@@ -120,26 +203,26 @@ class MMModemVoiceInterface(ServiceInterface):
 
     @method()
     async def DeleteCall(self, path: 'o'):
-        if path in self.props['Calls'].value:
-            await self.ofono_interfaces['org.ofono.VoiceCallManager'].call_hangup_all()
-            self.props['Calls'].value.remove(path)
-            self.bus.unexport(path)
-            self.emit_properties_changed({'Calls': self.props['Calls'].value})
-            self.CallDeleted(path)
-
-            if 'org.ofono.SimManager' in self.ofono_interfaces and 'FixedDialing' in self.ofono_interface_props['org.ofono.SimManager']:
-                self.props['EmergencyOnly'] = Variant('b', self.ofono_interface_props['org.ofono.SimManager']['FixedDialing'].value)
-            else:
-                self.props['EmergencyOnly'] = Variant('b', False)
+        if path not in self.calls:
+            return
+
+        voicecall = self.calls[path].voicecall
+        # look the voicecall up before removing the call evicts it, it would stay cached otherwise
+        if voicecall != '/':
+            hangup = self.ofono_client["ofono_modem"][voicecall]['org.ofono.VoiceCall'].call_hangup
+        else:
+            hangup = self.ofono_interfaces['org.ofono.VoiceCallManager'].call_hangup_all
+
+        self.remove_mm_call(path)
+
+        try:
+            await hangup()
+        except Exception as e:
+            pass
 
     @method()
     async def CreateCall(self, properties: 'a{sv}') -> 'o':
-        global call_i
-
-        if 'org.ofono.SimManager' in self.ofono_interfaces and 'FixedDialing' in self.ofono_interface_props['org.ofono.SimManager']:
-            self.props['EmergencyOnly'] = Variant('b', self.ofono_interface_props['org.ofono.SimManager']['FixedDialing'].value)
-        else:
-            self.props['EmergencyOnly'] = Variant('b', False)
+        self.cancel_context_reactivation()
 
         mm_call_interface = MMCallInterface(self.index, self.bus, self.ofono_client, self.modem_name, self.ofono_modem, self.ofono_props, self.ofono_interfaces, self.ofono_interface_props)
         mm_call_interface.props.update({
@@ -149,15 +232,12 @@ class MMModemVoiceInterface(ServiceInterface):
             'Number': Variant('s', properties['number'].value),
         })
 
-        await self.ofono_interfaces['org.ofono.VoiceCallManager'].call_dial(properties['number'].value, 'disabled')
-        self.bus.export(f'/org/freedesktop/ModemManager1/Call/{call_i}', mm_call_interface)
-        self.props['Calls'].value.append(f'/org/freedesktop/ModemManager1/Call/{call_i}')
-        self.emit_properties_changed({'Calls': self.props['Calls'].value})
-        self.CallAdded(f'/org/freedesktop/ModemManager1/Call/{call_i}')
-        call_i_old = call_i
-        call_i += 1
+        voicecall = await self.ofono_interfaces['org.ofono.VoiceCallManager'].call_dial(properties['number'].value, 'disabled')
+        # ofono's CallAdded can beat the Dial reply, the call then already has its object
+        if voicecall in self.voicecalls:
+            return self.voicecalls[voicecall]
 
-        return f'/org/freedesktop/ModemManager1/Call/{call_i_old}'
+        return self.add_mm_call(mm_call_interface, voicecall)
 
     @method()
     async def HoldAndAccept(self):
@@ -201,14 +281,5 @@ class MMModemVoiceInterface(ServiceInterface):
     def EmergencyOnly(self) -> 'b':
         return self.props['EmergencyOnly'].value
 
-    def ofono_changed(self, name, varval):
-        self.ofono_props[name] = varval
+    def ofono_state_changed(self, iface, name, varval):
         self.set_props()
-
-    def ofono_interface_changed(self, iface):
-        def ch(name, varval):
-            if iface in self.ofono_interface_props:
-                self.ofono_interface_props[iface][name] = varval
-            self.set_props()
-
-        return ch
@@ -3,7 +3,19 @@ from dbus_next.service import (ServiceInterface,
 from dbus_next.constants import PropertyAccess
 from dbus_next import Variant, DBusError
 
-class MMSimInterface(ServiceInterface):
+from ofono2mm.utils import CoalescedServiceInterface
+
+class MMSimInterface(CoalescedServiceInterface):
+    ofono_inputs = [
+        ('org.ofono.SimManager', 'Present'),
+        ('org.ofono.SimManager', 'CardIdentifier'),
+        ('org.ofono.SimManager', 'SubscriberIdentity'),
+        ('org.ofono.NetworkRegistration', 'Name'),
+        ('org.ofono.NetworkRegistration', 'MobileNetworkCode'),
+        ('org.ofono.NetworkRegistration', 'MobileCountryCode'),
+        ('org.ofono.VoiceCallManager', 'EmergencyNumbers'),
+    ]
+
     def __init__(self, index, bus, ofono_client, modem_name, ofono_modem, ofono_props, ofono_interfaces, ofono_interface_props):
         super().__init__('org.freedesktop.ModemManager1.Sim')
         self.index = index
@@ -32,11 +44,11 @@ class MMSimInterface(ServiceInterface):
         }
 
     def set_props(self):
-        old_props = self.props
+        old_props = self.props.copy()
 
         if 'org.ofono.SimManager' in self.ofono_interface_props:
             if 'Present' in self.ofono_interface_props['org.ofono.SimManager']:
-                if self.ofono_interface_props['org.ofono.SimManager']:
+                if self.ofono_interface_props['org.ofono.SimManager']['Present'].value:
                     self.props['Active'] = Variant('b', True)
                 else:
                     self.props['Active'] = Variant('b', False)
@@ -78,9 +90,12 @@ class MMSimInterface(ServiceInterface):
         if 'org.ofono.VoiceCallManager' in self.ofono_interface_props:
             self.props['EmergencyNumbers'] = Variant('as', self.ofono_interface_props['org.ofono.VoiceCallManager']['EmergencyNumbers'].value if 'EmergencyNumbers' in self.ofono_interface_props['org.ofono.VoiceCallManager'] else [])
 
+        changed_props = {}
         for prop in self.props:
             if self.props[prop].value != old_props[prop].value:
-                self.emit_properties_changed({prop: self.props[prop].value})
+                changed_props.update({ prop: self.props[prop].value })
+
+        self.emit_properties_changed(changed_props)
 
     @method()
     async def SendPin(self, pin: 's'):
@@ -161,15 +176,5 @@ class MMSimInterface(ServiceInterface):
     def Removability(self) -> 'u':
         return self.props['Removability'].value
 
-    def ofono_changed(self, name, varval):
-        self.ofono_props[name] = varval
+    def ofono_state_changed(self, iface, name, varval):
         self.set_props()
-
-    def ofono_interface_changed(self, iface):
-        def ch(name, varval):
-            if iface in self.ofono_interface_props:
-                self.ofono_interface_props[iface][name] = varval
-
-            self.set_props()
-
-        return ch
@@ -3,7 +3,29 @@ from dbus_next.service import (ServiceInterface, method,
 from dbus_next.constants import PropertyAccess
 from dbus_next import Variant
 
-class MMSmsInterface(ServiceInterface):
+from ofono2mm.utils import CoalescedServiceInterface
+
+def sms_props():
+    # shared with the object manager listing of messages that are not exported
+    return {
+        "State": Variant('u', 0), # default value unknown MM_SMS_STATE_UNKNOWN
+        "PduType": Variant('u', 0), # default value unknown MM_SMS_PDU_TYPE_UNKNOWN
+        "Number": Variant('s', ''),
+        "Text": Variant('s', ''),
+        "SMSC": Variant('s', ''),
+        "Validity": Variant('(uv)', [0, Variant('u', 0)]), # hardcoded value unknown MM_SMS_VALIDITY_TYPE_UNKNOWN
+        "Class": Variant('i', -1), # -1 for 3GPP2/CDMA
+        "TeleserviceId": Variant('u', 0), # hardcoded value MM_SMS_CDMA_SERVICE_CATEGORY_UNKNOWN
+        "ServiceCategory": Variant('u', 0), # hardcoded value MM_SMS_CDMA_SERVICE_CATEGORY_UNKNOWN
+        "DeliveryReportRequest": Variant('b', False),
+        "MessageReference": Variant('u', 0),
+        "Timestamp": Variant('s', ''),
+        "DischargeTimestamp": Variant('s', ''),
+        "DeliveryState": Variant('u', 0), # hardcoded value received MM_SMS_DELIVERY_STATE_COMPLETED_RECEIVED
+        "Storage": Variant('u', 0) # hardcoded value unknown
+    }
+
+class MMSmsInterface(CoalescedServiceInterface):
     def __init__(self, index, bus, ofono_client, modem_name, ofono_modem, ofono_props, ofono_interfaces, ofono_interface_props):
         super().__init__('org.freedesktop.ModemManager1.Sms')
         self.index = index
@@ -15,31 +37,17 @@ class MMSmsInterface(ServiceInterface):
         self.ofono_props = ofono_props
         self.ofono_interfaces = ofono_interfaces
         self.ofono_interface_props = ofono_interface_props
-        self.props = {
-            "State": Variant('u', 0), # default value unknown MM_SMS_STATE_UNKNOWN
-            "PduType": Variant('u', 0), # default value unknown MM_SMS_PDU_TYPE_UNKNOWN
-            "Number": Variant('s', ''),
-            "Text": Variant('s', ''),
-            "SMSC": Variant('s', ''),
-            "Validity": Variant('(uv)', [0, Variant('u', 0)]), # hardcoded value unknown MM_SMS_VALIDITY_TYPE_UNKNOWN
-            "Class": Variant('i', -1), # -1 for 3GPP2/CDMA
-            "TeleserviceId": Variant('u', 0), # hardcoded value MM_SMS_CDMA_SERVICE_CATEGORY_UNKNOWN
-            "ServiceCategory": Variant('u', 0), # hardcoded value MM_SMS_CDMA_SERVICE_CATEGORY_UNKNOWN
-            "DeliveryReportRequest": Variant('b', False),
-            "MessageReference": Variant('u', 0),
-            "Timestamp": Variant('s', ''),
-            "DischargeTimestamp": Variant('s', ''),
-            "DeliveryState": Variant('u', 0), # hardcoded value received MM_SMS_DELIVERY_STATE_COMPLETED_RECEIVED
-            "Storage": Variant('u', 0) # hardcoded value unknown
-        }
+        self.props = sms_props()
+        self.mm_modem_messaging = None
+        self.path = None
 
     @method()
     def Send(self):
-        pass
+        self.mm_modem_messaging.queue_message(self.path)
 
     @method()
     def Store(self, storage: 'u'):
-        pass
+        self.mm_modem_messaging.store_message(self.path, storage)
 
     @dbus_property(access=PropertyAccess.READ)
     def State(self) -> 'u':
@@ -0,0 +1,97 @@
+from dbus_next.aio import MessageBus
+from dbus_next.constants import MessageType
+from dbus_next import Message
+
+class ObjectManagerBus(MessageBus):
+    """
+    A message bus serving org.freedesktop.DBus.ObjectManager for every
+    object below /org/freedesktop/ModemManager1.
+
+    dbus_next already answers GetManagedObjects on any path and emits
+    InterfacesAdded and InterfacesRemoved whenever an interface is
+    exported or unexported, but sends the signals from the path of the
+    object itself. Object manager clients like libmm-glib only listen on
+    the path of the manager, so the signals of modems, SIMs, bearers,
+    messages and calls are sent from there instead.
+
+    Objects that exist but are not exported, like stored messages nobody
+    used lately, are reported by listers. A lister returns the interfaces
+    and properties of its objects by path, and GetManagedObjects adds the
+    ones that are not exported to its reply. Such objects are exported
+    and unexported with export_listed and unexport_listed, which do not
+    emit the signals, as clients already know about them.
+
+    Usage is as follows:
+
+    bus = await ObjectManagerBus(bus_type=BusType.SYSTEM).connect()
+    bus.add_object_lister(lister)
+    bus.export_listed(path, interface)
+    bus.unexport_listed(path, interface)
+    bus.listed_object_removed(path, [interface_name])
+    bus.remove_object_lister(lister)
+    """
+
+    manager_path = '/org/freedesktop/ModemManager1'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.object_listers = []
+        self.quiet_paths = set()
+
+    def send(self, msg):
+        if msg.message_type == MessageType.SIGNAL and msg.interface == 'org.freedesktop.DBus.ObjectManager' and msg.path.startswith(self.manager_path + '/'):
+            msg.path = self.manager_path
+
+        return super().send(msg)
+
+    def add_object_lister(self, lister):
+        self.object_listers.append(lister)
+
+    def remove_object_lister(self, lister):
+        if lister in self.object_listers:
+            self.object_listers.remove(lister)
+
+    def export_listed(self, path, interface):
+        self.quiet_paths.add(path)
+        try:
+            self.export(path, interface)
+        finally:
+            self.quiet_paths.discard(path)
+
+    def unexport_listed(self, path, interface):
+        self.quiet_paths.add(path)
+        try:
+            self.unexport(path, interface)
+        finally:
+            self.quiet_paths.discard(path)
+
+    def listed_object_removed(self, path, interfaces):
+        # the object is gone without ever being exported
+        super()._emit_interface_removed(path, interfaces)
+
+    def _emit_interface_added(self, path, interface):
+        if path not in self.quiet_paths:
+            super()._emit_interface_added(path, interface)
+
+    def _emit_interface_removed(self, path, removed_interfaces):
+        if path not in self.quiet_paths:
+            super()._emit_interface_removed(path, removed_interfaces)
+
+    def _default_get_managed_objects_handler(self, msg, send_reply):
+        listed = {}
+        for lister in self.object_listers:
+            for path, interfaces in lister().items():
+                if path not in self._path_exports and (msg.path == '/' or path.startswith(msg.path + '/')):
+                    listed[path] = interfaces
+
+        if not listed:
+            return super()._default_get_managed_objects_handler(msg, send_reply)
+
+        def reply(result):
+            if result.message_type == MessageType.METHOD_RETURN:
+                result = Message.new_method_return(msg, result.signature, [{**listed, **result.body[0]}])
+
+            send_reply(result)
+
+        reply.send_error = send_reply.send_error
+        super()._default_get_managed_objects_handler(msg, reply)
@@ -0,0 +1,45 @@
+class ObjectPathAllocator:
+    """
+    Hands out the object paths of bearers, calls and other objects that
+    come and go below /org/freedesktop/ModemManager1.
+
+    Every kind of object has its own counter that only ever grows, so a
+    path is never handed out twice, not even after its object is gone.
+    Allocated paths are kept in a map to the modem owning them, to look
+    up or release every path of a modem at once.
+
+    Usage is as follows:
+
+    path = object_paths.allocate('Bearer', mm_modem)
+    object_paths.owner(path)
+    object_paths.release(path)
+    object_paths.release_all(mm_modem)
+
+    Allocating does not await, so modems exporting objects concurrently
+    from their own coroutines can not end up with the same path.
+    """
+
+    def __init__(self, prefix='/org/freedesktop/ModemManager1'):
+        self.prefix = prefix
+        self.counters = {}
+        self.owners = {}
+
+    def allocate(self, kind, owner=None):
+        index = self.counters.get(kind, 0)
+        self.counters[kind] = index + 1
+
+        path = f'{self.prefix}/{kind}/{index}'
+        self.owners[path] = owner
+        return path
+
+    def owner(self, path):
+        return self.owners.get(path)
+
+    def release(self, path):
+        self.owners.pop(path, None)
+
+    def release_all(self, owner):
+        for path in [path for path, path_owner in self.owners.items() if path_owner is owner]:
+            self.owners.pop(path)
+
+object_paths = ObjectPathAllocator()
@@ -2,6 +2,9 @@ from dbus_next.service import (ServiceInterface,
                                method, dbus_property, signal)
 from dbus_next.constants import PropertyAccess
 from dbus_next import Variant, DBusError, BusType
+from dbus_next import introspection as intr
+
+from ofono2mm.metrics import metrics
 
 import asyncio
 
@@ -26,6 +29,10 @@ class CachedClient:
 
     client = CachedClient()
     interface = client[INTROSPECTION][OBJECT_PATH][INTERFACE]
+
+    Once an object goes away, evict(OBJECT_PATH) drops it and everything
+    below it from the cache. Hits, misses, evictions and the cache size
+    are tracked in the metrics registry under <bus_name>.client.
     """
 
     bus_name = None
@@ -42,27 +49,50 @@ class CachedClient:
         assert self.introspections is not None
 
         self.bus = bus
-        self.cache = {}
+        self.nodes = {}
+        self.proxies = {}
+        self.interfaces = {}
+        self.metrics_prefix = f'{self.bus_name}.client'
 
-        # Load introspections
+        # Load and parse the introspections once, proxies for every path share them
         for introspection, path in self.introspections.items():
             with open(path, "r") as f:
-                self.cache[hash(introspection)] = f.read()
+                self.nodes[introspection] = intr.Node.parse(f.read())
 
     def get_interface(self, introspection, path, interface):
-        path_hashed = hash(path)
-        interface_hashed = hash(path + interface)
+        key = (path, interface)
+
+        if key in self.interfaces:
+            metrics.inc(f'{self.metrics_prefix}.hits')
+            return self.interfaces[key]
+
+        metrics.inc(f'{self.metrics_prefix}.misses')
+        if not path in self.proxies:
+            self.proxies[path] = self.bus.get_proxy_object(self.bus_name, path, self.nodes[introspection])
+
+        try:
+            self.interfaces[key] = self.proxies[path].get_interface(interface)
+        except Exception as e:
+            self.interfaces[key] = None  # skip over org.ofono.IpMultimediaSystem
+
+        metrics.set(f'{self.metrics_prefix}.size', len(self.interfaces))
+        return self.interfaces[key]
+
+    def evict(self, path):
+        """
+        Drops the proxies of path and of the objects below it. Signal
+        handlers still connected on them must be removed beforehand.
+        """
 
-        if not interface_hashed in self.cache:
-            if not path_hashed in self.cache:
-                self.cache[path_hashed] = self.bus.get_proxy_object(self.bus_name, path, self.cache[hash(introspection)])
+        prefix = path.rstrip('/') + '/'
+        for proxy_path in [proxy_path for proxy_path in self.proxies if proxy_path == path or proxy_path.startswith(prefix)]:
+            self.proxies.pop(proxy_path)
 
-            try:
-                self.cache[interface_hashed] = self.cache[path_hashed].get_interface(interface)
-            except Exception as e:
-                self.cache[interface_hashed] = None  # skip over org.ofono.IpMultimediaSystem
+        for key in [key for key in self.interfaces if key[0] == path or key[0].startswith(prefix)]:
+            self.interfaces.pop(key)
+            metrics.inc(f'{self.metrics_prefix}.evictions')
 
-        return self.cache[interface_hashed]
+        metrics.set(f'{self.metrics_prefix}.size', len(self.interfaces))
 
     def __getitem__(self, introspection):
         """
@@ -85,6 +115,7 @@ class Ofono(CachedClient):
     introspections = {
         "ofono" : '/usr/lib/ofono2mm/ofono.xml',
         'ofono_context' : '/usr/lib/ofono2mm/ofono_context.xml',
+        'ofono_message' : '/usr/lib/ofono2mm/ofono_message.xml',
         'ofono_modem' : '/usr/lib/ofono2mm/ofono_modem.xml',
         'ofono_operator' : '/usr/lib/ofono2mm/ofono_operator.xml',
     }
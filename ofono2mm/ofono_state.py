@@ -0,0 +1,70 @@
+class OfonoState:
+    """
+    A per-modem store of the oFono modem and interface properties.
+
+    The ModemManager interfaces of a modem all read the same dicts instead
+    of keeping their own copies, and subscribe to the oFono
+    (interface, property) inputs they derive their properties from. The
+    properties of the modem object itself live under 'org.ofono.Modem'.
+
+    Usage is as follows:
+
+    state = OfonoState()
+    state.subscribe([('org.ofono.SimManager', 'Present')], callback)
+    state.update('org.ofono.SimManager', 'Present', Variant('b', True))
+
+    Subscribers are called as callback(iface, name, value). When a whole
+    interface appears or disappears, name and value are None.
+    """
+
+    def __init__(self):
+        self.props = {}
+        self.interface_props = {}
+        self.subscribers = {}
+
+    def subscribe(self, inputs, callback):
+        """
+        Calls callback whenever one of the given (interface, property)
+        inputs changes, or when one of their interfaces comes and goes.
+        """
+
+        for iface, name in inputs:
+            callbacks = self.subscribers.setdefault(iface, {}).setdefault(name, [])
+            if callback not in callbacks:
+                callbacks.append(callback)
+
+    def unsubscribe(self, callback):
+        for names in self.subscribers.values():
+            for callbacks in names.values():
+                if callback in callbacks:
+                    callbacks.remove(callback)
+
+    def update(self, iface, name, value):
+        if iface == 'org.ofono.Modem':
+            self.props[name] = value
+        elif iface in self.interface_props:
+            self.interface_props[iface][name] = value
+        else:
+            return
+
+        for callback in list(self.subscribers.get(iface, {}).get(name, [])):
+            callback(iface, name, value)
+
+    def set_interface(self, iface, props):
+        self.interface_props[iface] = props
+        self.notify_interface(iface)
+
+    def remove_interface(self, iface):
+        if iface in self.interface_props:
+            self.interface_props.pop(iface)
+            self.notify_interface(iface)
+
+    def notify_interface(self, iface):
+        callbacks = []
+        for names in self.subscribers.get(iface, {}).values():
+            for callback in names:
+                if callback not in callbacks:
+                    callbacks.append(callback)
+
+        for callback in callbacks:
+            callback(iface, None, None)
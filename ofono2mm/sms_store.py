@@ -0,0 +1,84 @@
+import os
+import sqlite3
+
+from ofono2mm.metrics import metrics
+
+class SmsStore:
+    """
+    Keeps the messages of every modem in a SQLite database so they survive
+    a restart. The row id of a message doubles as the number in its
+    /org/freedesktop/ModemManager1/SMS/ object path.
+
+    Messages hold one-time codes and the like, so the state directory is
+    only accessible to the daemon and the database only readable by it.
+
+    If the database can not be opened, for example because the state
+    directory is missing or read-only, the store falls back to an
+    in-memory database and messages only last until the daemon exits.
+    """
+
+    def __init__(self, path='/var/lib/ofono2mm/sms.db'):
+        self.path = path
+        self.db = None
+
+    def open(self):
+        if self.db is not None:
+            return self.db
+
+        try:
+            # the packaged directory is created world readable, tighten it as well
+            os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+            os.chmod(os.path.dirname(self.path), 0o700)
+            os.close(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600))
+            os.chmod(self.path, 0o600)
+            self.db = sqlite3.connect(self.path)
+            self.create_tables()
+        except (OSError, sqlite3.Error) as e:
+            metrics.inc('sms.store_fallbacks')
+            self.db = sqlite3.connect(':memory:')
+            self.create_tables()
+
+        return self.db
+
+    def create_tables(self):
+        self.db.execute('''CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            modem TEXT NOT NULL,
+            state INTEGER NOT NULL,
+            pdu_type INTEGER NOT NULL,
+            number TEXT NOT NULL,
+            text TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            delivery_report_request INTEGER NOT NULL
+        )''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS messages_modem ON messages (modem, id)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS messages_number ON messages (number)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS messages_timestamp ON messages (timestamp)')
+        self.db.commit()
+
+    def add(self, modem, props):
+        db = self.open()
+        cursor = db.execute('INSERT INTO messages (modem, state, pdu_type, number, text, timestamp, delivery_report_request) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                            (modem, props['State'].value, props['PduType'].value, props['Number'].value, props['Text'].value, props['Timestamp'].value, props['DeliveryReportRequest'].value))
+        db.commit()
+        return cursor.lastrowid
+
+    def update_state(self, message_id, state):
+        db = self.open()
+        db.execute('UPDATE messages SET state = ? WHERE id = ?', (state, message_id))
+        db.commit()
+
+    def remove(self, message_id):
+        db = self.open()
+        db.execute('DELETE FROM messages WHERE id = ?', (message_id,))
+        db.commit()
+
+    def get(self, message_id):
+        db = self.open()
+        return db.execute('SELECT id, state, pdu_type, number, text, timestamp, delivery_report_request FROM messages WHERE id = ?', (message_id,)).fetchone()
+
+    def list(self, modem):
+        db = self.open()
+        return db.execute('SELECT id, state, pdu_type, number, text, timestamp, delivery_report_request FROM messages WHERE modem = ? ORDER BY id', (modem,)).fetchall()
+
+sms_store = SmsStore()
@@ -1,38 +1,159 @@
+from dbus_next.service import ServiceInterface
+
+from ofono2mm.metrics import metrics
+
 import asyncio
+import random
+import time
 
-def async_retryable(times=0):
+class RetryPolicy:
     """
-    Decorator that allows to retry the given function n times.
+    Retries a coroutine function with an exponential backoff, and stops
+    retrying altogether once it keeps failing.
 
-    Usage:
+    Usage is as follows:
+
+    policy = RetryPolicy("bearer_connect", max_attempts=0)
+    await policy.run(connect)
 
-    @async_retryable(5)
-    async def fail():
-        raise Exception("This function will be tried five times!")
+    Attempt n waits base_delay * factor ** n seconds (at most max_delay)
+    before the next one, randomly stretched or shrunk by up to jitter
+    times that. If max_attempts is 0, the function is retried
+    indefinitely.
 
-    If times is 0 (default), the function will be retried indefinitely.
+    After failure_threshold failures in a row the circuit opens: every run
+    sharing the policy stops retrying until resume() is called, or until
+    max_delay has passed, after which a single attempt is let through.
+    A failure_threshold of 0 disables the circuit breaker.
+
+    Attempts, failures, successes, give ups and circuit openings are
+    counted in the metrics registry under retry.<name>.
     """
 
-    def decorator(func):
-            async def wrapper(*args, **kwargs):
-                    current_try = 0
-                    while times == 0 or current_try < times:
-                            try:
-                                    result = await func(*args, **kwargs)
-                            except Exception as e:
-                                    if current_try == times-1:
-                                            raise
+    def __init__(self, name, base_delay=1, factor=2, max_delay=300, jitter=0.2, max_attempts=0, failure_threshold=5):
+        self.name = name
+        self.base_delay = base_delay
+        self.factor = factor
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.max_attempts = max_attempts
+        self.failure_threshold = failure_threshold
+        self.consecutive_failures = 0
+        self.resumed = None
+
+    def is_open(self):
+        return self.resumed is not None
+
+    def get_delay(self, attempt):
+        delay = min(self.max_delay, self.base_delay * self.factor ** attempt)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def resume(self):
+        """
+        Closes the circuit, letting the waiting runs retry right away.
+        """
+
+        self.consecutive_failures = 0
+        if self.resumed is not None:
+            self.resumed.set()
+            self.resumed = None
+
+    async def wait_resumed(self):
+        try:
+            await asyncio.wait_for(self.resumed.wait(), self.max_delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self, func, *args, **kwargs):
+        attempt = 0
+        while True:
+            if self.is_open():
+                await self.wait_resumed()
+
+            metrics.inc(f'retry.{self.name}.attempts')
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                metrics.inc(f'retry.{self.name}.failures')
+                attempt += 1
+                self.consecutive_failures += 1
+
+                if self.max_attempts != 0 and attempt >= self.max_attempts:
+                    metrics.inc(f'retry.{self.name}.give_ups')
+                    raise
+
+                if self.failure_threshold != 0 and self.consecutive_failures >= self.failure_threshold:
+                    if not self.is_open():
+                        metrics.inc(f'retry.{self.name}.circuit_opened')
+                        self.resumed = asyncio.Event()
+                else:
+                    # print("Trying again, error was %s" % e)
+                    await asyncio.sleep(self.get_delay(attempt - 1))
+            else:
+                metrics.inc(f'retry.{self.name}.successes')
+                self.consecutive_failures = 0
+                if self.is_open():
+                    self.resume()
+
+                return result
+
+class SignalSubscriptions:
+    """
+    Keeps track of the signal handlers connected on dbus_next proxy
+    interfaces, so an object can detach all of them when it goes away
+    instead of leaving them behind on the cached proxies.
+
+    Usage is as follows:
+
+    subscriptions = SignalSubscriptions()
+    subscriptions.on(interface, 'property_changed', handler)
+    subscriptions.off(interface, 'property_changed', handler)
+    subscriptions.clear(interface)
+    subscriptions.clear()
+
+    Connecting a handler that is already connected does nothing. The
+    number of live handlers across every registry is kept in the
+    subscriptions.handlers gauge of the metrics registry.
+    """
+
+    live = 0
+
+    def __init__(self):
+        self.handlers = set()
+
+    def on(self, interface, signal, handler):
+        key = (interface, signal, handler)
+        if key in self.handlers:
+            return
+
+        getattr(interface, f'on_{signal}')(handler)
+        self.handlers.add(key)
+        self.count(1)
+
+    def off(self, interface, signal, handler):
+        key = (interface, signal, handler)
+        if key not in self.handlers:
+            return
+
+        self.handlers.remove(key)
+        try:
+            getattr(interface, f'off_{signal}')(handler)
+        except Exception as e:
+            pass
 
-                                    # print("Trying again, error was %s" % e)
-                                    await asyncio.sleep(5)
+        self.count(-1)
 
-                                    current_try += 1
-                            else:
-                                    return result
+    def clear(self, interface=None):
+        """
+        Detaches the handlers connected on interface, or all of them.
+        """
 
-            return wrapper
+        for key in [key for key in self.handlers if interface is None or key[0] is interface]:
+            self.off(*key)
 
-    return decorator
+    def count(self, value):
+        SignalSubscriptions.live += value
+        metrics.set('subscriptions.handlers', SignalSubscriptions.live)
 
 def async_locked(func):
     async def wrapper(*args, **kwargs):
@@ -41,3 +162,102 @@ def async_locked(func):
 
     func.__lock = asyncio.Lock()
     return wrapper
+
+async def async_run_stages(stages, timings=None):
+    """
+    Runs the given stages concurrently, starting each one as soon as the
+    stages it depends on are done.
+
+    Usage:
+
+    await async_run_stages({
+        "interfaces": (init_interfaces, []),
+        "sim": (init_sim, ["interfaces"]),
+        "voice": (init_voice, ["interfaces"]),
+    }, timings)
+
+    If timings is a dict, the time in seconds each stage took to run is
+    stored in it under the stage name. When a stage fails, the stages
+    still running are cancelled before the error is raised.
+    """
+
+    tasks = {}
+
+    async def run_stage(name, func, dependencies):
+        if dependencies:
+            await asyncio.gather(*[tasks[dependency] for dependency in dependencies])
+
+        start = time.monotonic()
+        try:
+            await func()
+        finally:
+            if timings is not None:
+                timings[name] = time.monotonic() - start
+
+    for name, (func, dependencies) in stages.items():
+        tasks[name] = asyncio.ensure_future(run_stage(name, func, dependencies))
+
+    try:
+        await asyncio.gather(*tasks.values())
+    except Exception as e:
+        for task in tasks.values():
+            task.cancel()
+
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+
+class CoalescedServiceInterface(ServiceInterface):
+    """
+    ServiceInterface that merges the property changes emitted within
+    emit_window seconds into a single PropertiesChanged signal.
+
+    Usage is the same as with ServiceInterface:
+
+    self.emit_properties_changed({'State': 8})
+    self.emit_properties_changed({'SignalQuality': [60, True]})
+
+    will be sent as one PropertiesChanged signal carrying both properties.
+    With an emit_window of 0 (default), the changes made in the same event
+    loop iteration are merged. Empty changes are never sent.
+    """
+
+    emit_window = 0
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.pending_changed_properties = {}
+        self.pending_invalidated_properties = []
+        self.pending_emit = None
+
+    def emit_properties_changed(self, changed_properties, invalidated_properties=[]):
+        if not changed_properties and not invalidated_properties:
+            return
+
+        for prop in changed_properties:
+            if prop in self.pending_invalidated_properties:
+                self.pending_invalidated_properties.remove(prop)
+        for prop in invalidated_properties:
+            self.pending_changed_properties.pop(prop, None)
+            if prop not in self.pending_invalidated_properties:
+                self.pending_invalidated_properties.append(prop)
+        self.pending_changed_properties.update(changed_properties)
+
+        if self.pending_emit is None:
+            loop = asyncio.get_event_loop()
+            if self.emit_window > 0:
+                self.pending_emit = loop.call_later(self.emit_window, self.flush_properties_changed)
+            else:
+                self.pending_emit = loop.call_soon(self.flush_properties_changed)
+
+    def flush_properties_changed(self):
+        if self.pending_emit is not None:
+            self.pending_emit.cancel()
+            self.pending_emit = None
+
+        changed_properties = self.pending_changed_properties
+        invalidated_properties = self.pending_invalidated_properties
+        self.pending_changed_properties = {}
+        self.pending_invalidated_properties = []
+
+        if changed_properties or invalidated_properties:
+            super().emit_properties_changed(changed_properties, invalidated_properties)
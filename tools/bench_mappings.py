@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Compares the lookup tables in ofono2mm.mappings against the if/elif chains
+they replaced, for the conversions on the property update path.
+
+Usage is as follows:
+
+python3 tools/bench_mappings.py [iterations]
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ofono2mm.mappings import ACCESS_TECHNOLOGIES, SUPPORTED_MODES, TECHNOLOGY_MODES, TECHNOLOGY_PREFERENCES, UNLOCK_RETRIES
+
+TECHNOLOGIES = ['nr', 'lte', 'hspa', 'hsupa', 'hsdpa', 'umts', 'edge', 'gprs', 'gsm']
+AVAILABLE_TECHNOLOGIES = ['gsm', 'umts', 'lte']
+RETRIES = {'pin': 3, 'puk': 10, 'pin2': 3, 'puk2': 10}
+
+def chain_access_technology(technology):
+    if technology == "nr":
+        return 1 << 15, 6
+    elif technology == "lte":
+        return 1 << 14, 5
+    elif technology == "hspa":
+        return 1 << 8, 3
+    elif technology == "hsupa":
+        return 1 << 7, 3
+    elif technology == "hsdpa":
+        return 1 << 6, 3
+    elif technology == "umts":
+        return 1 << 5, 3
+    elif technology == "edge":
+        return 1 << 4, 2
+    elif technology == "gprs":
+        return 1 << 3, 2
+    elif technology == "gsm":
+        return 1 << 1, 2
+
+    return 0, 0
+
+def table_access_technology(technology):
+    return ACCESS_TECHNOLOGIES.get(technology, (0, 0))
+
+def chain_modes(ofono_techs, ofono_pref):
+    caps = 0
+    modes = 0
+    pref = 0
+    if 'gsm' in ofono_techs:
+        caps |= 4
+        modes |= 2
+    if 'umts' in ofono_techs:
+        caps |= 4
+        modes |= 4
+    if 'lte' in ofono_techs:
+        caps |= 8
+        modes |= 8
+    if 'nr' in ofono_techs:
+        caps |= 16
+        modes |= 16
+
+    if ofono_pref == 'nr':
+        pref = 16
+    if ofono_pref == 'lte':
+        pref = 8
+    if ofono_pref == 'umts':
+        pref = 4
+    if ofono_pref == 'gsm':
+        pref = 2
+
+    supported_modes = []
+    if modes == 30:
+        supported_modes.append([30, 16])
+        supported_modes.append([14, 8])
+        supported_modes.append([6, 4])
+        supported_modes.append([2, 0])
+    if modes == 28:
+        supported_modes.append([28, 0])
+    if modes == 26:
+        supported_modes.append([26, 0])
+    if modes == 24:
+        supported_modes.append([24, 0])
+    if modes == 22:
+        supported_modes.append([22, 0])
+    if modes == 20:
+        supported_modes.append([20, 0])
+    if modes == 18:
+        supported_modes.append([18, 0])
+    if modes == 16:
+        supported_modes.append([16, 0])
+    if modes == 14:
+        supported_modes.append([14, 8])
+        supported_modes.append([6, 4])
+        supported_modes.append([2, 0])
+    if modes == 12:
+        supported_modes.append([12, 8])
+        supported_modes.append([4, 0])
+    if modes == 10:
+        supported_modes.append([10, 8])
+        supported_modes.append([2, 0])
+    if modes == 8:
+        supported_modes.append([8, 0])
+    if modes == 6:
+        supported_modes.append([6, 4])
+        supported_modes.append([2, 0])
+    if modes == 4:
+        supported_modes.append([4, 0])
+    if modes == 2:
+        supported_modes.append([2, 0])
+
+    return caps, pref, supported_modes
+
+def table_modes(ofono_techs, ofono_pref):
+    caps = 0
+    modes = 0
+    for ofono_tech in ofono_techs:
+        if ofono_tech in TECHNOLOGY_MODES:
+            caps |= TECHNOLOGY_MODES[ofono_tech][0]
+            modes |= TECHNOLOGY_MODES[ofono_tech][1]
+
+    return caps, TECHNOLOGY_PREFERENCES.get(ofono_pref, 0), SUPPORTED_MODES.get(modes, [])
+
+def chain_unlock_retries(retries):
+    unlock_retries = {}
+    if 'pin' in retries:
+        unlock_retries[2] = retries['pin']
+    if 'pin2' in retries:
+        unlock_retries[3] = retries['pin2']
+    if 'puk' in retries:
+        unlock_retries[4] = retries['puk']
+    if 'puk2' in retries:
+        unlock_retries[5] = retries['puk2']
+    if 'service' in retries:
+        unlock_retries[6] = retries['service']
+    if 'servicepuk' in retries:
+        unlock_retries[7] = retries['servicepuk']
+    if 'network' in retries:
+        unlock_retries[8] = retries['network']
+    if 'networkpuk' in retries:
+        unlock_retries[9] = retries['networkpuk']
+    if 'corp' in retries:
+        unlock_retries[11] = retries['corp']
+    if 'corppuk' in retries:
+        unlock_retries[12] = retries['corppuk']
+    if 'netsub' in retries:
+        unlock_retries[15] = retries['netsub']
+    if 'netsubpuk' in retries:
+        unlock_retries[16] = retries['netsubpuk']
+
+    return unlock_retries
+
+def table_unlock_retries(retries):
+    unlock_retries = {}
+    for key in retries:
+        if key in UNLOCK_RETRIES:
+            unlock_retries[UNLOCK_RETRIES[key]] = retries[key]
+
+    return unlock_retries
+
+def bench(name, chain, table, iterations):
+    # the same conversions both ways, so the tables can not win by being wrong
+    assert chain() == table(), name
+
+    chain_ns = min(timeit.repeat(chain, number=iterations, repeat=5)) / iterations * 1e9
+    table_ns = min(timeit.repeat(table, number=iterations, repeat=5)) / iterations * 1e9
+    print(f'{name:<20} chain {chain_ns:8.1f} ns  table {table_ns:8.1f} ns  {chain_ns / table_ns:5.2f}x')
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    bench('access technology', lambda: [chain_access_technology(technology) for technology in TECHNOLOGIES], lambda: [table_access_technology(technology) for technology in TECHNOLOGIES], iterations)
+    bench('modes', lambda: chain_modes(AVAILABLE_TECHNOLOGIES, 'lte'), lambda: table_modes(AVAILABLE_TECHNOLOGIES, 'lte'), iterations)
+    bench('unlock retries', lambda: chain_unlock_retries(RETRIES), lambda: table_unlock_retries(RETRIES), iterations)
+
+if __name__ == '__main__':
+    main()
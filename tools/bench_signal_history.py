@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Measures the per-sample append cost, the statistics cost and the memory of
+the SignalHistory kept for every modem, next to a deque of sample dicts
+of the same length.
+
+Usage is as follows:
+
+python3 tools/bench_signal_history.py [samples]
+"""
+
+from collections import deque
+import math
+import os
+import random
+import sys
+import time
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ofono2mm.mm_modem_signal import SignalHistory
+
+def make_samples(count):
+    # lte samples as add_sample builds them from the network monitor
+    random.seed(0)
+    return [{
+        'rssi': float(-113 + 2 * random.randint(0, 31)),
+        'rsrp': float(-140 + random.randint(0, 97)),
+        'rsrq': -19.5 + random.randint(0, 34) / 2,
+        'snr': float(random.randint(-20, 30)),
+    } for i in range(count)]
+
+def deque_statistics(samples, window):
+    since = time.monotonic() - window if window != 0 else -math.inf
+    stats = {}
+    for key in SignalHistory.keys:
+        values = sorted(sample[key] for timestamp, sample in samples if timestamp >= since and key in sample)
+        if values:
+            stats[key] = {
+                'count': float(len(values)),
+                'min': values[0],
+                'max': values[-1],
+                'mean': math.fsum(values) / len(values),
+                'p50': values[(len(values) - 1) * 50 // 100],
+                'p90': values[(len(values) - 1) * 90 // 100],
+                'p99': values[(len(values) - 1) * 99 // 100],
+            }
+
+    return stats
+
+def measure_memory(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return kept, after - before
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    samples = make_samples(count)
+    size = 512
+
+    history = SignalHistory(size)
+    start = time.perf_counter()
+    for values in samples:
+        history.append(time.monotonic(), values)
+    history_append_ns = (time.perf_counter() - start) / count * 1e9
+
+    rolling = deque(maxlen=size)
+    start = time.perf_counter()
+    for values in samples:
+        rolling.append((time.monotonic(), values))
+    deque_append_ns = (time.perf_counter() - start) / count * 1e9
+
+    # the same statistics both ways, so neither side can win by computing less
+    assert history.statistics(0) == deque_statistics(rolling, 0)
+
+    history_stats_ms = min(timeit.repeat(lambda: history.statistics(0), number=10, repeat=5)) / 10 * 1e3
+    deque_stats_ms = min(timeit.repeat(lambda: deque_statistics(rolling, 0), number=10, repeat=5)) / 10 * 1e3
+
+    def fill_history():
+        kept = SignalHistory(size)
+        for values in samples[:size]:
+            kept.append(time.monotonic(), values)
+        return kept
+
+    def fill_deque():
+        # copies, the dicts of the samples above are already allocated
+        kept = deque(maxlen=size)
+        for values in samples[:size]:
+            kept.append((time.monotonic(), dict(values)))
+        return kept
+
+    history_memory = measure_memory(fill_history)[1]
+    deque_memory = measure_memory(fill_deque)[1]
+
+    print(f'{count} samples, {size} kept')
+    print(f'append      history {history_append_ns:8.1f} ns/sample  deque {deque_append_ns:8.1f} ns/sample')
+    print(f'statistics  history {history_stats_ms:8.3f} ms  deque {deque_stats_ms:8.3f} ms')
+    print(f'memory      history {history_memory / 1024:8.1f} KiB  deque {deque_memory / 1024:8.1f} KiB')
+
+if __name__ == '__main__':
+    main()
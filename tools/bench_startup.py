@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Measures how long the daemon takes to start: the import time of the
+ofono2mm package, and with --name the time from launching main.py until
+org.freedesktop.ModemManager1 is owned on the system bus, which needs
+ofono running there. Fails when Geoclue gets loaded at startup or when
+the median import time is above --max-import-ms, so it can gate
+regressions.
+
+dbus_next imports gi on its own when it is installed, for its glib
+backend, so only Geoclue itself is checked.
+
+Usage is as follows:
+
+python3 tools/bench_startup.py [--runs 10] [--max-import-ms 500] [--name]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SCRIPT = '''
+import sys, time
+start = time.perf_counter()
+import ofono2mm
+import ofono2mm.mm_modem_location
+print(time.perf_counter() - start, ofono2mm.mm_modem_location.Geoclue is not None or 'gi.repository.Geoclue' in sys.modules)
+'''
+
+def measure_import():
+    # a fresh interpreter each time, the import is only slow once
+    output = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT], cwd=root, check=True, capture_output=True, text=True).stdout.split()
+    return float(output[0]), output[1] == 'True'
+
+async def measure_name(timeout):
+    from dbus_next.aio import MessageBus
+    from dbus_next import BusType, Message
+
+    bus = await MessageBus(bus_type=BusType.SYSTEM).connect()
+    start = time.perf_counter()
+    daemon = subprocess.Popen([sys.executable, os.path.join(root, 'main.py')], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            reply = await bus.call(Message(destination='org.freedesktop.DBus', path='/org/freedesktop/DBus', interface='org.freedesktop.DBus',
+                                           member='NameHasOwner', signature='s', body=['org.freedesktop.ModemManager1']))
+            if reply.body[0]:
+                return time.perf_counter() - start
+
+            await asyncio.sleep(0.005)
+
+        return None
+    finally:
+        daemon.terminate()
+        daemon.wait()
+        bus.disconnect()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--max-import-ms', type=float, default=None)
+    parser.add_argument('--name', action='store_true', help='also measure the time until the bus name is owned')
+    args = parser.parse_args()
+
+    failed = False
+    results = [measure_import() for i in range(args.runs)]
+    import_ms = statistics.median(seconds for seconds, geoclue_loaded in results) * 1e3
+    print(f'import ofono2mm  median {import_ms:8.1f} ms  max {max(seconds for seconds, geoclue_loaded in results) * 1e3:8.1f} ms')
+
+    if any(geoclue_loaded for seconds, geoclue_loaded in results):
+        print('Geoclue was loaded at startup, it should only load on the first location request')
+        failed = True
+
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        print(f'import time is above {args.max_import_ms} ms')
+        failed = True
+
+    if args.name:
+        names = [asyncio.run(measure_name(30)) for i in range(args.runs)]
+        if None in names:
+            print('org.freedesktop.ModemManager1 was never owned, is ofono running?')
+            failed = True
+        else:
+            print(f'name owned       median {statistics.median(names) * 1e3:8.1f} ms  max {max(names) * 1e3:8.1f} ms')
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()